@@ -1,6 +1,6 @@
 from __future__ import absolute_import
 from ..version import __version__
-from .client import add_metric, report_metric
+from .client import add_metric, report_metric, enable_batching
 from . import server
 
 if not server.redis_daemon_exist():
@@ -1,14 +1,19 @@
 from __future__ import absolute_import
 import json
+import threading
+import time
 import redis
 from redis.exceptions import ConnectionError
 
 from ..exceptions import ClipperException
 from .schema import Prom_Type
 from .config import CHANNEL_NAME, DEFAULT_BUCKETS, UNIX_SOCKET_PATH, API_VERSION
+from .config import DEFAULT_FLUSH_INTERVAL_MS
 
 r = redis.Redis(unix_socket_path=UNIX_SOCKET_PATH)
 metric_pool = set()
+metric_types = {}
+aggregator = None
 
 
 def _send_to_redis(message_dict):
@@ -55,6 +60,7 @@ def add_metric(name, metric_type, description, buckets=DEFAULT_BUCKETS):
 
     _send_to_redis(message_dict)
     metric_pool.add(name)
+    metric_types[name] = metric_type
 
 
 def report_metric(name, val):
@@ -74,6 +80,10 @@ def report_metric(name, val):
     Please use clipper_admin.metric.add_metric to add this metric"
                                .format(name))
 
+    if aggregator is not None:
+        aggregator.add(name, float(val))
+        return
+
     message_dict = {
         'version': API_VERSION,
         'endpoint': 'report',
@@ -84,3 +94,74 @@ def report_metric(name, val):
     }
 
     _send_to_redis(message_dict)
+
+
+class MetricAggregator:
+    """
+    Accumulates reports in process and publishes them as a single
+    batched message per flush interval: the sum of the increments of a
+    Counter, the last value of a Gauge and the observations of a
+    Histogram or Summary.
+    """
+
+    def __init__(self, flush_interval_ms):
+        self.flush_interval_ms = flush_interval_ms
+        self.lock = threading.Lock()
+        self.pending = {}
+        flusher = threading.Thread(target=self._flush_task)
+        flusher.daemon = True
+        flusher.start()
+
+    def add(self, name, val):
+        with self.lock:
+            values = self.pending.setdefault(name, [])
+            if not values or metric_types[name] in ('Histogram', 'Summary'):
+                values.append(val)
+            elif metric_types[name] == 'Counter':
+                values[0] += val
+            else:
+                values[0] = val
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        message_dict = {
+            'version': API_VERSION,
+            'endpoint': 'report_batch',
+            'data': [{
+                'name': name,
+                'data': values
+            } for name, values in pending.items()]
+        }
+
+        _send_to_redis(message_dict)
+
+    def _flush_task(self):
+        while True:
+            time.sleep(self.flush_interval_ms / 1000.0)
+            try:
+                self.flush()
+            except ConnectionError:
+                # The reports of this interval are dropped, like a
+                # failed publish drops a single report
+                pass
+
+
+def enable_batching(flush_interval_ms=DEFAULT_FLUSH_INTERVAL_MS):
+    """Aggregate reports in process instead of publishing each of them
+
+    After this call, `report_metric` only records the value locally; the
+    values recorded are published as one batched message every
+    `flush_interval_ms` milliseconds.
+
+    Parameters
+    ----------
+    flush_interval_ms: int or float
+        The interval between two batched messages.
+    """
+    global aggregator
+    if aggregator is None:
+        aggregator = MetricAggregator(flush_interval_ms)
@@ -1,5 +1,5 @@
 from . import __version__
-from jsonschema import validate
+from jsonschema import Draft4Validator
 from enum import Enum
 
 
@@ -51,10 +51,30 @@ report_schema = {
     'required': ['data', 'name']
 }
 
+report_batch_schema = {
+    'type': 'array',
+    'items': {
+        'properties': {
+            'data': {
+                'type': 'array',
+                'items': {
+                    'type': 'number'
+                }
+            },
+            'name': {
+                'type': 'string'
+            },
+        },
+        'type': 'object',
+        'required': ['data', 'name']
+    }
+}
+
+# The data of a message is checked against the schema of its endpoint only
 schema = {
     'properties': {
         'endpoint': {
-            'enum': ['add', 'report'],
+            'enum': ['add', 'report', 'report_batch'],
             'type': 'string'
         },
         'version': {
@@ -62,21 +82,27 @@ schema = {
             'enum': versions
         },
         'data': {
-            'oneOf': [add_schema, report_schema]
+            'type': ['object', 'array']
         }
     },
     'required': ['endpoint', 'version', 'data'],
     'type': 'object'
 }
 
+# Validators are built once, not for every message
+validator = Draft4Validator(schema)
+inner_validators = {
+    'add': Draft4Validator(add_schema),
+    'report': Draft4Validator(report_schema),
+    'report_batch': Draft4Validator(report_batch_schema)
+}
 
-def validate_schema(message_dict):
-    inner_schema = {'add': add_schema, 'report': report_schema}
 
-    validate(message_dict, schema)
+def validate_schema(message_dict):
+    validator.validate(message_dict)
     endpoint = message_dict['endpoint']
 
     # This line will error if validate fails
-    validate(message_dict['data'], inner_schema[endpoint])
+    inner_validators[endpoint].validate(message_dict['data'])
 
     return True
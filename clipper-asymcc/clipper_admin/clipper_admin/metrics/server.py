@@ -71,6 +71,10 @@ def handle_message(message_dict, metric_pool):
                    data.get('buckets', DEFAULT_BUCKETS), metric_pool)
     elif endpoint == 'report':
         report_metric(data['name'], data['data'], metric_pool)
+    elif endpoint == 'report_batch':
+        for entry in data:
+            for val in entry['data']:
+                report_metric(entry['name'], val, metric_pool)
 
 
 def start_server():
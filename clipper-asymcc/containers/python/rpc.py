@@ -10,14 +10,19 @@ import sys
 import os
 import yaml
 import logging
+import atexit
 from collections import deque
 if sys.version_info < (3, 0):
     from subprocess32 import Popen, PIPE
+    import Queue as queue
 else:
     from subprocess import Popen, PIPE
+    import queue
+    from logging.handlers import QueueHandler, QueueListener
 from prometheus_client import start_http_server
 from prometheus_client.core import Counter, Gauge, Histogram, Summary
 import clipper_admin.metrics as metrics
+from clipper_admin.metrics.config import DEFAULT_FLUSH_INTERVAL_MS
 
 RPC_VERSION = 3
 
@@ -61,9 +66,47 @@ INITIAL_HEADER_BUFFER_SIZE = 1024
 
 INPUT_HEADER_DTYPE = np.dtype(np.uint64)
 
+# Inputs of at least this size are received without copying, as views
+# on their ZMQ frames. Smaller ones are cheaper to copy
+ZERO_COPY_RECV_MIN_BYTES = 1024
+
+# Maximum number of received requests waiting for the model
+DEFAULT_REQUEST_QUEUE_SIZE = 8
+# How long the receiver waits for room in a full request queue
+# before forwarding responses again
+REQUEST_QUEUE_PUT_TIMEOUT_SECONDS = 0.05
+# In-process pipe carrying serialized responses to the thread that
+# owns the Clipper socket
+RESPONSE_PIPE_ADDRESS = "inproc://clipper_responses_{}"
+
+# Per-request records are logged at DEBUG, so they are off by default
+DEFAULT_LOG_LEVEL = "INFO"
+# Interval between the request timing summaries logged at INFO
+DEFAULT_TIMING_SUMMARY_SECONDS = 60
+
 logger = logging.getLogger(__name__)
 
 
+def configure_logging(level):
+    """
+    Writes the records of the container runtime to stdout. Where
+    available, the records are handed through a queue to a background
+    thread, so that serving threads never block on the write
+    """
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    if sys.version_info >= (3, 0):
+        log_queue = queue.Queue()
+        listener = QueueListener(log_queue, handler)
+        listener.start()
+        atexit.register(listener.stop)
+        handler = QueueHandler(log_queue)
+    logger.handlers = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+
 def string_to_input_type(input_str):
     input_str = input_str.strip().lower()
     byte_strs = ["b", "bytes", "byte"]
@@ -124,6 +167,49 @@ class EventHistory:
         return self.history_buffer
 
 
+class RequestTimings:
+    """
+    In-memory aggregate of the per-request stage timings, in milliseconds,
+    summarized and reset once per interval. Only used by the sender thread
+    """
+    STAGES = ("recv", "parse", "queue", "handle", "end_to_end")
+
+    def __init__(self, interval_seconds):
+        self.interval_seconds = interval_seconds
+        self.reset()
+
+    def reset(self):
+        self.start = time.time()
+        self.count = 0
+        self.sums = dict((stage, 0.0) for stage in self.STAGES)
+        self.maxes = dict((stage, 0.0) for stage in self.STAGES)
+
+    def add(self, **stage_times):
+        self.count += 1
+        for stage, t in stage_times.items():
+            self.sums[stage] += t
+            self.maxes[stage] = max(self.maxes[stage], t)
+
+    def summary(self):
+        """
+        Returns
+        -------
+        str
+            The summary of the current interval once it is over,
+            otherwise None
+        """
+        elapsed = time.time() - self.start
+        if self.count == 0 or elapsed < self.interval_seconds:
+            return None
+        summary = "%d requests in %.1f s, mean/max ms: " % (self.count,
+                                                            elapsed)
+        summary += ", ".join(
+            "%s %.2f/%.2f" % (stage, self.sums[stage] / self.count,
+                              self.maxes[stage]) for stage in self.STAGES)
+        self.reset()
+        return summary
+
+
 class PredictionError(Exception):
     def __init__(self, value):
         self.value = value
@@ -133,18 +219,31 @@ class PredictionError(Exception):
 
 
 class Server(threading.Thread):
-    def __init__(self, context, clipper_ip, clipper_port):
+    """
+    Serves predictions as a pipeline of three threads: the receiver (`run`)
+    reads requests from Clipper into a bounded queue, the compute worker
+    evaluates the model on them and the sender serializes the responses.
+    ZMQ sockets are not thread safe, so the sender hands the serialized
+    frames back to the receiver, which owns the Clipper socket, over an
+    in-process pipe.
+    """
+
+    def __init__(self, context, clipper_ip, clipper_port,
+                 queue_size=DEFAULT_REQUEST_QUEUE_SIZE,
+                 timing_summary_seconds=DEFAULT_TIMING_SUMMARY_SECONDS):
         threading.Thread.__init__(self)
         self.context = context
         self.clipper_ip = clipper_ip
         self.clipper_port = clipper_port
+        self.queue_size = queue_size
         self.event_history = EventHistory(EVENT_HISTORY_BUFFER_SIZE)
+        self.request_timings = RequestTimings(timing_summary_seconds)
 
     def validate_rpc_version(self, received_version):
         if received_version != RPC_VERSION:
-            print(
-                "ERROR: Received an RPC message with version: {clv} that does not match container version: {mcv}"
-                .format(clv=received_version, mcv=RPC_VERSION))
+            logger.error(
+                "Received an RPC message with version: %s that does not match container version: %s",
+                received_version, RPC_VERSION)
 
     def handle_prediction_request(self, prediction_request):
         """
@@ -199,7 +298,7 @@ class Server(threading.Thread):
         elif self.model_input_type == INPUT_TYPE_STRINGS:
             return self.model.predict_strings
         else:
-            print(
+            logger.error(
                 "Attempted to get predict function for invalid model input type!"
             )
             raise
@@ -207,19 +306,108 @@ class Server(threading.Thread):
     def get_event_history(self):
         return self.event_history.get_events()
 
+    def compute_task(self):
+        while True:
+            prediction_request, times = self.request_queue.get()
+            t4 = datetime.now()
+            try:
+                response = self.handle_prediction_request(prediction_request)
+            except Exception:
+                # Raised again by the receiver, like it was before
+                # the model ran on its own thread
+                self.failure = sys.exc_info()
+                return
+            self.response_queue.put((response, times + (t4, datetime.now())))
+
+    def send_task(self, collect_metrics):
+        pipe = self.context.socket(zmq.PUSH)
+        pipe.connect(RESPONSE_PIPE_ADDRESS.format(id(self)))
+        while True:
+            response, (t1, t2, t3, t4, t5) = self.response_queue.get()
+            pipe.send_multipart(response.frames())
+            self.event_history.insert(EVENT_HISTORY_SENT_CONTAINER_CONTENT)
+
+            recv_time = (t2 - t1).total_seconds()
+            parse_time = (t3 - t2).total_seconds()
+            queue_time = (t4 - t3).total_seconds()
+            handle_time = (t5 - t4).total_seconds()
+
+            if collect_metrics:
+                metrics.report_metric('clipper_mc_pred_total', 1)
+                metrics.report_metric('clipper_mc_recv_time_ms',
+                                      recv_time * 1000.0)
+                metrics.report_metric('clipper_mc_parse_time_ms',
+                                      parse_time * 1000.0)
+                metrics.report_metric('clipper_mc_handle_time_ms',
+                                      handle_time * 1000.0)
+                metrics.report_metric(
+                    'clipper_mc_end_to_end_latency_ms',
+                    (t5 - t1).total_seconds() * 1000.0)
+
+            self.request_timings.add(
+                recv=recv_time * 1000.0,
+                parse=parse_time * 1000.0,
+                queue=queue_time * 1000.0,
+                handle=handle_time * 1000.0,
+                end_to_end=(t5 - t1).total_seconds() * 1000.0)
+            logger.debug("recv: %f s, parse: %f s, queue: %f s, handle: %f s",
+                         recv_time, parse_time, queue_time, handle_time)
+            summary = self.request_timings.summary()
+            if summary is not None:
+                logger.info(summary)
+
+    def check_failure(self):
+        if self.failure is not None:
+            raise self.failure[1]
+
+    def forward_responses(self, pipe, socket):
+        while True:
+            try:
+                frames = pipe.recv_multipart(zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                return
+            socket.send_multipart(frames)
+
+    def enqueue_request(self, prediction_request, times, pipe, socket):
+        # A full queue holds the receiver back, but responses keep flowing
+        while True:
+            try:
+                self.request_queue.put(
+                    (prediction_request, times),
+                    timeout=REQUEST_QUEUE_PUT_TIMEOUT_SECONDS)
+                return
+            except queue.Full:
+                self.check_failure()
+                self.forward_responses(pipe, socket)
+
     def run(self, collect_metrics=True):
-        print("Serving predictions for {0} input type.".format(
-            input_type_to_string(self.model_input_type)))
+        logger.info("Serving predictions for %s input type.",
+                    input_type_to_string(self.model_input_type))
         connected = False
         clipper_address = "tcp://{0}:{1}".format(self.clipper_ip,
                                                  self.clipper_port)
         poller = zmq.Poller()
-        sys.stdout.flush()
-        sys.stderr.flush()
 
         self.input_header_buffer = bytearray(INITIAL_HEADER_BUFFER_SIZE)
-        self.input_content_buffer = bytearray(
-            INITIAL_INPUT_CONTENT_BUFFER_SIZE)
+        # Requests in the queue and in the model still reference their
+        # content buffers: one for each of them, plus the one receiving
+        self.input_content_buffers = [
+            bytearray(INITIAL_INPUT_CONTENT_BUFFER_SIZE)
+            for _ in range(self.queue_size + 2)
+        ]
+        self.input_content_buffer_idx = 0
+
+        self.request_queue = queue.Queue(maxsize=self.queue_size)
+        self.response_queue = queue.Queue()
+        self.failure = None
+        pipe = self.context.socket(zmq.PULL)
+        pipe.bind(RESPONSE_PIPE_ADDRESS.format(id(self)))
+        poller.register(pipe, zmq.POLLIN)
+        for target, args in ((self.compute_task, ()),
+                             (self.send_task, (collect_metrics, ))):
+            worker = threading.Thread(target=target, args=args)
+            worker.daemon = True
+            worker.start()
 
         while True:
             socket = self.context.socket(zmq.DEALER)
@@ -229,6 +417,11 @@ class Server(threading.Thread):
             while True:
                 receivable_sockets = dict(
                     poller.poll(SOCKET_POLLING_TIMEOUT_MILLIS))
+                self.check_failure()
+                if pipe in receivable_sockets:
+                    self.forward_responses(pipe, socket)
+                    if socket not in receivable_sockets:
+                        continue
                 if socket not in receivable_sockets or receivable_sockets[socket] != zmq.POLLIN:
                     # Failed to receive a message before the specified polling timeout
                     if connected:
@@ -238,15 +431,14 @@ class Server(threading.Thread):
                             time_delta.microseconds / 1000)
                         if time_delta_millis >= SOCKET_ACTIVITY_TIMEOUT_MILLIS:
                             # Terminate the session
-                            print("Connection timed out, reconnecting...")
+                            logger.warning(
+                                "Connection timed out, reconnecting...")
                             connected = False
                             poller.unregister(socket)
                             socket.close()
                             break
                         else:
                             self.send_heartbeat(socket)
-                        sys.stdout.flush()
-                        sys.stderr.flush()
                     continue
 
                 # Received a message before the polling timeout
@@ -264,9 +456,7 @@ class Server(threading.Thread):
                 msg_type = struct.unpack("<I", msg_type_bytes)[0]
                 if msg_type == MESSAGE_TYPE_HEARTBEAT:
                     self.event_history.insert(EVENT_HISTORY_RECEIVED_HEARTBEAT)
-                    print("Received heartbeat!")
-                    sys.stdout.flush()
-                    sys.stderr.flush()
+                    logger.debug("Received heartbeat!")
                     heartbeat_type_bytes = socket.recv()
                     heartbeat_type = struct.unpack("<I",
                                                    heartbeat_type_bytes)[0]
@@ -276,7 +466,7 @@ class Server(threading.Thread):
                 elif msg_type == MESSAGE_TYPE_NEW_CONTAINER:
                     self.event_history.insert(
                         EVENT_HISTORY_RECEIVED_CONTAINER_METADATA)
-                    print(
+                    logger.warning(
                         "Received erroneous new container message from Clipper!"
                     )
                     continue
@@ -286,7 +476,7 @@ class Server(threading.Thread):
                     msg_id_bytes = socket.recv()
                     msg_id = int(struct.unpack("<I", msg_id_bytes)[0])
 
-                    print("Got start of message %d " % msg_id)
+                    logger.debug("Got start of message %d", msg_id)
                     # list of byte arrays
                     request_header = socket.recv()
                     request_type = struct.unpack("<I", request_header)[0]
@@ -336,57 +526,24 @@ class Server(threading.Thread):
                         t2 = datetime.now()
 
                         if int(input_type) != int(self.model_input_type):
-                            print((
-                                "Received incorrect input. Expected {expected}, "
-                                "received {received}").format(
-                                    expected=input_type_to_string(
-                                        int(self.model_input_type)),
-                                    received=input_type_to_string(
-                                        int(input_type))))
+                            logger.error(
+                                "Received incorrect input. Expected %s, received %s",
+                                input_type_to_string(int(self.model_input_type)),
+                                input_type_to_string(int(input_type)))
                             raise
 
                         t3 = datetime.now()
 
                         prediction_request = PredictionRequest(
                             msg_id_bytes, inputs)
-                        response = self.handle_prediction_request(
-                            prediction_request)
-
-                        t4 = datetime.now()
-
-                        response.send(socket, self.event_history)
-
-                        recv_time = (t2 - t1).total_seconds()
-                        parse_time = (t3 - t2).total_seconds()
-                        handle_time = (t4 - t3).total_seconds()
-
-                        if collect_metrics:
-                            metrics.report_metric('clipper_mc_pred_total', 1)
-                            metrics.report_metric('clipper_mc_recv_time_ms',
-                                                  recv_time * 1000.0)
-                            metrics.report_metric('clipper_mc_parse_time_ms',
-                                                  parse_time * 1000.0)
-                            metrics.report_metric('clipper_mc_handle_time_ms',
-                                                  handle_time * 1000.0)
-                            metrics.report_metric(
-                                'clipper_mc_end_to_end_latency_ms',
-                                (recv_time + parse_time + handle_time) *
-                                1000.0)
-
-                        print("recv: %f s, parse: %f s, handle: %f s" %
-                              (recv_time, parse_time, handle_time))
-
-                        sys.stdout.flush()
-                        sys.stderr.flush()
+                        self.enqueue_request(prediction_request,
+                                             (t1, t2, t3), pipe, socket)
 
                     else:
                         feedback_request = FeedbackRequest(msg_id_bytes, [])
                         response = self.handle_feedback_request(received_msg)
                         response.send(socket, self.event_history)
-                        print("recv: %f s" % ((t2 - t1).total_seconds()))
-
-                sys.stdout.flush()
-                sys.stderr.flush()
+                        logger.debug("recv: %f s", (t2 - t1).total_seconds())
 
     def recv_string_content(self, socket, num_inputs, input_sizes):
         # Create an empty numpy array that will contain
@@ -402,6 +559,15 @@ class Server(threading.Thread):
 
         return inputs
 
+    def recv_input_item(self, socket, input_size, input_dtype):
+        if input_size < ZERO_COPY_RECV_MIN_BYTES:
+            return np.frombuffer(socket.recv(copy=True), dtype=input_dtype)
+        # A read-only view on the received ZMQ frame. The view references
+        # the frame, so the frame lives exactly as long as the request's
+        # inputs do
+        input_item_frame = socket.recv(copy=False)
+        return np.frombuffer(input_item_frame.buffer, dtype=input_dtype)
+
     def recv_primitive_content(self, socket, num_inputs, input_sizes,
                                input_dtype):
         def recv_different_lengths():
@@ -409,28 +575,33 @@ class Server(threading.Thread):
             # input array references
             inputs = np.empty(num_inputs, dtype=object)
             for i in range(num_inputs):
-                # Receive input data and copy it into a byte
-                # buffer that can be parsed into a writeable
-                # array
-                input_item_buffer = socket.recv(copy=True)
-                input_item = np.frombuffer(
-                    input_item_buffer, dtype=input_dtype)
-                inputs[i] = input_item
+                inputs[i] = self.recv_input_item(socket, input_sizes[i],
+                                                 input_dtype)
 
             return inputs
 
         def recv_same_lengths():
+            if num_inputs == 1:
+                # A single input is already contiguous, no need to
+                # gather it into a content buffer
+                return self.recv_input_item(socket, input_sizes[0],
+                                            input_dtype).reshape((1, -1))
+
             input_type_size_bytes = input_dtype.itemsize
             input_content_size_bytes = sum(input_sizes)
             typed_input_content_size = int(
                 input_content_size_bytes / input_type_size_bytes)
 
-            if len(self.input_content_buffer) < input_content_size_bytes:
-                self.input_content_buffer = bytearray(
+            idx = self.input_content_buffer_idx
+            self.input_content_buffer_idx = (idx + 1) % len(
+                self.input_content_buffers)
+            if len(self.input_content_buffers[idx]) < input_content_size_bytes:
+                self.input_content_buffers[idx] = bytearray(
                     input_content_size_bytes * 2)
+            input_content_buffer = self.input_content_buffers[idx]
 
             input_content_view = memoryview(
-                self.input_content_buffer)[:input_content_size_bytes]
+                input_content_buffer)[:input_content_size_bytes]
 
             item_start_idx = 0
             for i in range(num_inputs):
@@ -445,7 +616,7 @@ class Server(threading.Thread):
 
             # Reinterpret the content buffer as a typed numpy array
             inputs = np.frombuffer(
-                self.input_content_buffer,
+                input_content_buffer,
                 dtype=input_dtype)[:typed_input_content_size]
 
             # All inputs are of the same size, so we can use
@@ -470,9 +641,7 @@ class Server(threading.Thread):
         socket.send_string(str(self.model_input_type), zmq.SNDMORE)
         socket.send(struct.pack("<I", RPC_VERSION))
         self.event_history.insert(EVENT_HISTORY_SENT_CONTAINER_METADATA)
-        print("Sent container metadata!")
-        sys.stdout.flush()
-        sys.stderr.flush()
+        logger.info("Sent container metadata!")
 
     def send_heartbeat(self, socket):
         if sys.version_info < (3, 0):
@@ -481,7 +650,7 @@ class Server(threading.Thread):
             socket.send_string("", zmq.SNDMORE)
         socket.send(struct.pack("<I", MESSAGE_TYPE_HEARTBEAT))
         self.event_history.insert(EVENT_HISTORY_SENT_HEARTBEAT)
-        print("Sent heartbeat!")
+        logger.debug("Sent heartbeat!")
 
 
 class PredictionRequest:
@@ -531,6 +700,24 @@ class PredictionResponse:
         self.outputs.append(output)
         self.num_outputs += 1
 
+    def frames(self):
+        """
+        Returns
+        ----------
+        list
+            The message frames of the encapsulated response data,
+            ready to be sent as one multipart message
+        """
+        assert self.num_outputs > 0
+        output_header, header_length_bytes = self._create_output_header()
+        return [
+            "".encode('utf-8'),
+            struct.pack("<I", MESSAGE_TYPE_CONTAINER_CONTENT),
+            self.msg_id,
+            struct.pack("<Q", header_length_bytes),
+            output_header,
+        ] + self.outputs
+
     def send(self, socket, event_history):
         """
         Sends the encapsulated response data via
@@ -543,25 +730,7 @@ class PredictionResponse:
             The RPC event history that should be
             updated as a result of this operation
         """
-        assert self.num_outputs > 0
-        output_header, header_length_bytes = self._create_output_header()
-        if sys.version_info < (3, 0):
-            socket.send("", flags=zmq.SNDMORE)
-        else:
-            socket.send_string("", flags=zmq.SNDMORE)
-        socket.send(
-            struct.pack("<I", MESSAGE_TYPE_CONTAINER_CONTENT),
-            flags=zmq.SNDMORE)
-        socket.send(self.msg_id, flags=zmq.SNDMORE)
-        socket.send(struct.pack("<Q", header_length_bytes), flags=zmq.SNDMORE)
-        socket.send(output_header, flags=zmq.SNDMORE)
-        for idx in range(self.num_outputs):
-            if idx == self.num_outputs - 1:
-                # Don't use the `SNDMORE` flag if
-                # this is the last output being sent
-                socket.send(self.outputs[idx])
-            else:
-                socket.send(self.outputs[idx], flags=zmq.SNDMORE)
+        socket.send_multipart(self.frames())
 
         event_history.insert(EVENT_HISTORY_SENT_CONTAINER_CONTENT)
 
@@ -644,43 +813,62 @@ class ModelContainerBase(object):
 class RPCService:
     def __init__(self, collect_metrics=True, read_config=True):
         self.collect_metrics = collect_metrics
+        self.queue_size = DEFAULT_REQUEST_QUEUE_SIZE
+        self.log_level = DEFAULT_LOG_LEVEL
+        self.timing_summary_seconds = DEFAULT_TIMING_SUMMARY_SECONDS
+        self.metrics_flush_interval_ms = DEFAULT_FLUSH_INTERVAL_MS
         if read_config:
             self._read_config_from_environment()
 
     def _read_config_from_environment(self):
+        # Logging is set up first, so that the configuration is reported
+        # through it
+        if "CLIPPER_LOG_LEVEL" in os.environ:
+            self.log_level = os.environ["CLIPPER_LOG_LEVEL"]
+        configure_logging(self.log_level)
+
         try:
             self.model_name = os.environ["CLIPPER_MODEL_NAME"]
         except KeyError:
-            print(
-                "ERROR: CLIPPER_MODEL_NAME environment variable must be set",
-                file=sys.stdout)
+            logger.error(
+                "CLIPPER_MODEL_NAME environment variable must be set")
             sys.exit(1)
         try:
             self.model_version = os.environ["CLIPPER_MODEL_VERSION"]
         except KeyError:
-            print(
-                "ERROR: CLIPPER_MODEL_VERSION environment variable must be set",
-                file=sys.stdout)
+            logger.error(
+                "CLIPPER_MODEL_VERSION environment variable must be set")
             sys.exit(1)
 
         self.host = "127.0.0.1"
         if "CLIPPER_IP" in os.environ:
             self.host = os.environ["CLIPPER_IP"]
         else:
-            print("Connecting to Clipper on localhost")
+            logger.info("Connecting to Clipper on localhost")
 
         self.port = 7000
         if "CLIPPER_PORT" in os.environ:
             self.port = int(os.environ["CLIPPER_PORT"])
         else:
-            print("Connecting to Clipper with default port: {port}".format(
-                port=self.port))
+            logger.info("Connecting to Clipper with default port: %s",
+                        self.port)
 
         self.input_type = "doubles"
         if "CLIPPER_INPUT_TYPE" in os.environ:
             self.input_type = os.environ["CLIPPER_INPUT_TYPE"]
         else:
-            print("Using default input type: doubles")
+            logger.info("Using default input type: doubles")
+
+        if "CLIPPER_RPC_QUEUE_SIZE" in os.environ:
+            self.queue_size = int(os.environ["CLIPPER_RPC_QUEUE_SIZE"])
+
+        if "CLIPPER_TIMING_SUMMARY_SECONDS" in os.environ:
+            self.timing_summary_seconds = float(
+                os.environ["CLIPPER_TIMING_SUMMARY_SECONDS"])
+
+        if "CLIPPER_METRICS_FLUSH_MS" in os.environ:
+            self.metrics_flush_interval_ms = float(
+                os.environ["CLIPPER_METRICS_FLUSH_MS"])
 
         self.model_path = os.environ["CLIPPER_MODEL_PATH"]
 
@@ -694,7 +882,8 @@ class RPCService:
         if self.server:
             return self.server.get_event_history()
         else:
-            print("Cannot retrieve message history for inactive RPC service!")
+            logger.error(
+                "Cannot retrieve message history for inactive RPC service!")
             raise
 
     def start(self, model):
@@ -703,13 +892,17 @@ class RPCService:
             model (object): The loaded model object ready to make predictions.
         """
 
+        if not logger.handlers:
+            # the configuration was not read from the environment
+            configure_logging(self.log_level)
         try:
             ip = socket.gethostbyname(self.host)
         except socket.error as e:
-            print("Error resolving %s: %s" % (self.host, e))
+            logger.error("Error resolving %s: %s", self.host, e)
             sys.exit(1)
         context = zmq.Context()
-        self.server = Server(context, ip, self.port)
+        self.server = Server(context, ip, self.port, self.queue_size,
+                             self.timing_summary_seconds)
         self.server.model_name = self.model_name
         self.server.model_version = self.model_version
         self.server.model_input_type = string_to_input_type(self.input_type)
@@ -722,6 +915,8 @@ class RPCService:
         if self.collect_metrics:
             start_metric_server()
             add_metrics()
+            # The per-request metrics are published in batches
+            metrics.enable_batching(self.metrics_flush_interval_ms)
 
         self.server.run(collect_metrics=self.collect_metrics)
 
@@ -0,0 +1,200 @@
+from config import Config
+import grpc
+import infer_pb2_grpc, infer_pb2
+from concurrent import futures
+from threading import Thread, Lock
+from queue import Queue
+import queue
+import itertools
+from coder import Coder
+from worker import Worker, Repairer, GroupFormer, requestPoolSize
+import argparse
+import socket
+import time
+import global_var
+
+RESP_TIME_OUT = 3
+
+
+class Router:
+    # Queries from all clients share one id space. Every query gets an
+    # internal id, and its result is routed from global_var.resp_queue back
+    # to the sink (a stream, or the Responsor) it came from under the
+    # client's own id.
+    def __init__(self) -> None:
+        self.ids = itertools.count()
+        self.routes = {}
+        self.lock = Lock()
+
+    def register(self, sink, client_id):
+        with self.lock:
+            image_id = next(self.ids)
+            self.routes[image_id] = (sink, client_id)
+        return image_id
+
+    def route_task(self):
+        while(True):
+            try:
+                image_id, label = global_var.resp_queue.get(block=True, timeout=RESP_TIME_OUT)
+            except queue.Empty:
+                if global_var.FLAG_STOP_THREAD:
+                    print("Router end")
+                    break
+                else:
+                    continue
+            with self.lock:
+                route = self.routes.pop(image_id, None)
+            if route is None:
+                # already answered (a late repair or reply) or never registered
+                print("no route for result:", image_id)
+                continue
+            sink, client_id = route
+            sink.put(('result', image_id, client_id, label))
+
+
+class AgentService(infer_pb2_grpc.GrpcServiceServicer):
+    # infer: single queries whose results are sent back in one piece. A
+    # request with an empty input closes the batch: its id is the number of
+    # queries sent and its port is where the client waits for the results.
+    # stream: queries and results on one bidirectional stream, each result
+    # is returned as soon as its query is predicted or repaired.
+    def __init__(self, conf, former, router, responsor) -> None:
+        super().__init__()
+        self.conf = conf
+        self.former = former
+        self.router = router
+        self.responsor = responsor
+
+    def infer(self, request, context) -> infer_pb2.InferResponse:
+        if request.input == b'':
+            self.former.flush()
+            self.responsor.expect(request.id, request.port)
+        else:
+            self.former.put(self.router.register(self.responsor.results, request.id), request.input)
+        return infer_pb2.InferResponse(output = "Recived input!")
+
+    def recv_task(self, request_iterator, results):
+        # a query is announced to the sending side before its result can be
+        try:
+            for request in request_iterator:
+                image_id = self.router.register(results, request.id)
+                deadline = None
+                if request.deadline_ms > 0:
+                    deadline = time.time() + request.deadline_ms / 1000.0
+                results.put(('query', image_id, request.id, deadline))
+                self.former.put(image_id, request.input)
+            self.former.flush()
+        finally:
+            results.put(None)
+
+    def stream(self, request_iterator, context):
+        results = Queue()
+        Thread(target=self.recv_task, args=(request_iterator, results)).start()
+        
+        pending = {}
+        closed = False
+        while context.is_active() and not (closed and not pending):
+            deadlines = [deadline for _, deadline in pending.values() if deadline is not None]
+            timeout = max(min(deadlines) - time.time(), 0) if deadlines else None
+            try:
+                item = results.get(block=True, timeout=timeout)
+            except queue.Empty:
+                item = ('timeout',)
+            
+            if item is None:
+                closed = True
+            elif item[0] == 'query':
+                _, image_id, client_id, deadline = item
+                pending[image_id] = (client_id, deadline)
+            elif item[0] == 'result':
+                _, image_id, client_id, label = item
+                # a result after its deadline was already answered as expired
+                if pending.pop(image_id, None) is not None:
+                    yield infer_pb2.InferResult(id=client_id, label=int(label))
+            
+            now = time.time()
+            for image_id, (client_id, deadline) in list(pending.items()):
+                if deadline is not None and deadline <= now:
+                    del pending[image_id]
+                    yield infer_pb2.InferResult(id=client_id, label=-1, expired=True)
+
+
+class Responsor:
+    # Collects the results of unary infer requests and sends them to the
+    # client's port once the announced number of queries is answered
+    def __init__(self) -> None:
+        self.results = Queue()
+        self.batches = Queue()
+
+    def expect(self, length, port):
+        self.batches.put((length, port))
+
+    def resp_task(self):
+        while(True):
+            try:
+                length, port = self.batches.get(block=True, timeout=RESP_TIME_OUT)
+            except queue.Empty:
+                if global_var.FLAG_STOP_THREAD:
+                    break
+                else:
+                    continue
+            print("=====resp_task start=========")
+            resp_str_list = []
+            for _ in range(length):
+                _, _, id, val = self.results.get()
+                resp_str_list.append(str(id)+' '+str(val))
+            resp_str = '\n'.join(resp_str_list)
+
+            # send result to client
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.connect(("localhost",port))
+            sock.sendall(bytes(resp_str, encoding='utf-8'))
+            sock.close()
+            print("=====resp_task end=========")
+
+
+class Agent:
+    def __init__(self, conf, former, router, responsor) -> None:
+        self.conf = conf
+        self.former = former
+        self.router = router
+        self.responsor = responsor
+
+        # server to response clients' request
+        self.rpcserver = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+
+    def run(self, port) -> None:
+        infer_pb2_grpc.add_GrpcServiceServicer_to_server(AgentService(self.conf, self.former, self.router, self.responsor), self.rpcserver)
+        self.rpcserver.add_insecure_port('[::]:{}'.format(port))
+        self.rpcserver.start()
+        self.rpcserver.wait_for_termination()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='AsymCC agent arguments')
+    parser.add_argument("--conf", type=str, default="./config/simple.json", help="Path of the config file")
+    parser.add_argument("--port", type=int, default=50052, help="Port to serve gRPC requests on")
+    args = parser.parse_args()
+
+    conf = Config(args.conf)
+    coder = Coder(conf)
+    global_var.queue_init(0, requestPoolSize(conf))
+
+    for i in range(conf.cfg['workerThrd_num']):
+        worker = Worker(conf, coder, i)
+        Thread(target=worker.process_task).start()
+        print("=========Worker start==========")
+
+    repairer = Repairer(conf, coder)
+    Thread(target=repairer.decode_task).start()
+    print("=========Repairer start==========")
+
+    router = Router()
+    Thread(target=router.route_task).start()
+    responsor = Responsor()
+    Thread(target=responsor.resp_task).start()
+    print("=========Responsor start==========")
+
+    former = GroupFormer(conf)
+    print("=========Agent start==========")
+    Agent(conf, former, router, responsor).run(args.port)
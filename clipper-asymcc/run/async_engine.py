@@ -0,0 +1,152 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import aiohttp
+import base64
+import time
+import global_var
+from info import ImageInfo, TimeSeries, INFO, LATENCY
+import torch
+from worker import CodedGroup, dropGroup, encodeGroup, groupTask, queryPayload, parseResponse, repairInput, bijSurvivors, TASK_ENCODE_TYPE
+from placement import getPlacement
+
+
+class AsyncEngine:
+    # Coded inference frontend on a single event loop. Every group is a
+    # coroutine (one future per group), queries to the Clipper query frontend
+    # share one pooled aiohttp session, and encode/decode run on small thread
+    # pools so they never block the loop.
+    def __init__(self, conf, coder) -> None:
+        self.conf = conf
+        self.ec_k = conf.cfg['ec_k']
+        self.coder = coder
+        self.encode_pool = ThreadPoolExecutor(max_workers=conf.cfg['workerThrd_num'])
+        self.decode_pool = ThreadPoolExecutor(max_workers=1)
+        self.session = None
+        self.placement = getPlacement(conf)
+
+    async def clipper_request(self, node, data):
+        url = "http://{}:1337/pytorch-irevnet-app/predict".format(self.placement.ips[node])
+        req_json = {
+            'input': base64.b64encode(data).decode()
+        }
+        start = self.placement.begin(node)
+        ok = False
+        try:
+            async with self.session.post(url, json=req_json) as resp:
+                output = (await resp.json())["output"]
+                ok = True
+                return output
+        finally:
+            self.placement.end(node, start, ok)
+            if ok:
+                # measured from the request itself, not from group start
+                LATENCY.add(float(time.time() - start) * 1000.0)
+
+    async def fetch_bij(self, data_list, out_list, outbij_list, failed):
+        # Lazily fetch out_bij of the surviving group members for a repair
+        need = [i for i in bijSurvivors(out_list, failed, self.ec_k) if outbij_list[i] is None]
+        nodes = self.placement.place_group(len(need))
+        outputs = await asyncio.gather(*[
+            self.clipper_request(node, queryPayload(data_list[i], self.conf, True))
+            for i, node in zip(need, nodes)], return_exceptions=True)
+        for i, output in zip(need, outputs):
+            try:
+                if isinstance(output, Exception):
+                    raise output
+                _, outbij_list[i] = parseResponse(output, self.conf)
+            except Exception as e:
+                # left as None, the decoder repairs without this out_bij
+                print("bij fetch failed:", i, repr(e))
+
+    def respond(self, image_id, out):
+        global_var.resp_queue_put((image_id, out.numpy().argmax()))
+        print("resp:",image_id)
+
+    async def infer_group(self, id_list, encode_list):
+        loop = asyncio.get_event_loop()
+        task = groupTask(id_list, encode_list, self.conf)
+        id_list, data_list = task.input[:2]
+        encodeTime = 0.0
+        if task.type == TASK_ENCODE_TYPE:
+            encode_data, encodeTime = await loop.run_in_executor(
+                self.encode_pool, encodeGroup, data_list, self.coder, self.conf.cfg['parity_format'])
+            id_list = id_list + [-1] * len(encode_data)
+            data_list = data_list + encode_data
+        group = CodedGroup(id_list, self.conf)
+
+        reqs = {}
+        nodes = self.placement.place_group(len(data_list))
+        for i, data in enumerate(data_list):
+            req = asyncio.ensure_future(self.clipper_request(nodes[i], queryPayload(data, self.conf)))
+            reqs[req] = i
+
+        finished, failed = False, []
+        pending = set(reqs)
+        while pending and not finished:
+            done, pending = await asyncio.wait(pending, timeout=group.timeout(),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for req in done:
+                i = reqs[req]
+                try:
+                    reply = parseResponse(req.result(), self.conf)
+                except Exception as e:
+                    print("query failed:", i, repr(e))
+                    group.fail(i)
+                    continue
+                end = time.time()
+                INFO.add_infertime(float(end - group.start) * 1000.0 + encodeTime)
+
+                group.add(i, *reply)
+                if id_list[i] >= 0:
+                    self.respond(id_list[i], group.out_list[i])
+
+            finished, failed = group.straggler()
+
+        for req in pending:
+            req.cancel()
+
+        # blank padding members are not repaired
+        failed_ids = [i for i in failed if id_list[i] >= 0]
+        if failed_ids and not group.repairable():
+            dropGroup(id_list, failed)
+        elif failed_ids:
+            print("straggler:",failed)
+            if self.conf.cfg['bij_fetch'] == 'lazy':
+                await self.fetch_bij(data_list, group.out_list, group.outbij_list, failed)
+            out_decode, outbij_decode, missing = repairInput(group.out_list, group.outbij_list, failed, self.ec_k)
+            decode_input = (out_decode.expand(len(failed_ids), *out_decode.shape),
+                            [outbij_decode] * len(failed_ids),
+                            missing.expand(len(failed_ids), *missing.shape),
+                            torch.tensor(failed_ids))
+            start = time.time()
+            resp_tensor = await loop.run_in_executor(self.decode_pool, self.coder.decode_batch, decode_input)
+            end = time.time()
+            print("decode costs: {} ms".format(float(end-start)*1000.0))
+            for i, resp in zip(failed_ids, resp_tensor):
+                INFO.add_decodetime(float(end - start) * 1000.0)
+                self.respond(id_list[i], resp)
+
+    async def send_groups(self, path_list, queryGroupRate):
+        timeSeq = TimeSeries(queryGroupRate)
+        connector = aiohttp.TCPConnector(limit=self.conf.cfg['async_conn_limit'])
+        timeout = aiohttp.ClientTimeout(total=self.conf.cfg['request_timeout_ms'] / 1000.0)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            self.session = session
+            groups = []
+            # the last group may be partial, groupTask completes it
+            for i in range(-(-global_var.resp_len // self.ec_k)):
+                id_list = []
+                encode_group = []
+                for j,fpath in enumerate(path_list[i*self.ec_k : min(i*self.ec_k + self.ec_k, global_var.resp_len)]):
+                    img = ImageInfo(i*self.ec_k + j, fpath)
+                    id_list.append(img.id)
+                    encode_group.append(img.byte)
+                await asyncio.sleep(timeSeq(i % queryGroupRate))
+                groups.append(asyncio.ensure_future(self.infer_group(id_list, encode_group)))
+            await asyncio.gather(*groups)
+
+    def run(self, path_list):
+        print("=========AsyncEngine start==========")
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(self.send_groups(path_list, self.conf.cfg['query_rate']))
+        print("AsyncEngine end")
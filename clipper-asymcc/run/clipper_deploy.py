@@ -2,26 +2,31 @@
 from clipper_admin import ClipperConnection, DockerContainerManager
 from clipper_admin.exceptions import ClipperException
 import io
+import copy
 from PIL import Image
 from torch.autograd import Variable
 import torchvision.transforms as transforms
 import clipper_admin.deployers.pytorch as pytorch_deployer
 from torchvision.models.resnet import resnet50
 import torch
+import numpy as np
 import os
 from config import Config
 import subprocess
 import argparse
-import pickle
+import struct
+import base64
+import functools
 import torch.nn as nn
 from torch.nn import Parameter
 import torch.nn.functional as F
 
 
 def split(x):
+    # channel views, convolutions take them as they are
     n = int(x.size()[1]/2)
-    x1 = x[:, :n, :, :].contiguous()
-    x2 = x[:, n:, :, :].contiguous()
+    x1 = x[:, :n, :, :]
+    x2 = x[:, n:, :, :]
     return x1, x2
 
 
@@ -33,12 +38,10 @@ class injective_pad(nn.Module):
     def __init__(self, pad_size):
         super(injective_pad, self).__init__()
         self.pad_size = pad_size
-        self.pad = nn.ZeroPad2d((0, 0, 0, pad_size))
 
     def forward(self, x):
-        x = x.permute(0, 2, 1, 3)
-        x = self.pad(x)
-        return x.permute(0, 2, 1, 3)
+        # zeros appended along the channels in a single copy
+        return F.pad(x, (0, 0, 0, 0, 0, self.pad_size))
 
     def inverse(self, x):
         return x[:, :x.size(1) - self.pad_size, :, :]
@@ -106,7 +109,8 @@ class irevnet_block(nn.Module):
         if self.stride == 2:
             x1 = self.psi.forward(x1)
             x2 = self.psi.forward(x2)
-        y1 = Fx2 + x1
+        # Fx2 is a fresh conv output, y1 = Fx2 + x1 reuses its storage
+        y1 = Fx2.add_(x1)
         return (x2, y1)
 
     def inverse(self, x):
@@ -114,8 +118,8 @@ class irevnet_block(nn.Module):
         x2, y1 = x[0], x[1]
         if self.stride == 2:
             x2 = self.psi.inverse(x2)
-        Fx2 = - self.bottleneck_block(x2)
-        x1 = Fx2 + y1
+        Fx2 = self.bottleneck_block(x2)
+        x1 = Fx2.neg_().add_(y1)
         if self.stride == 2:
             x1 = self.psi.inverse(x1)
         if self.pad != 0 and self.stride == 1:
@@ -199,13 +203,139 @@ class iRevNet(nn.Module):
 
 
 
+# Container copy of fuse_conv_bn and fold_bn (see models/iRevNet.py, also
+# copied in model/src/distill/models/iRevNet.py), keep all three in sync.
+def fuse_conv_bn(conv, bn):
+    """ convolution followed by eval-mode batchnorm as one convolution """
+    fused = nn.Conv2d(conv.in_channels, conv.out_channels, conv.kernel_size,
+                      stride=conv.stride, padding=conv.padding,
+                      dilation=conv.dilation, groups=conv.groups, bias=True)
+    scale = torch.rsqrt(bn.running_var + bn.eps)
+    if bn.affine:
+        scale = scale * bn.weight
+    shift = -bn.running_mean * scale
+    if bn.affine:
+        shift = shift + bn.bias
+    if conv.bias is not None:
+        shift = shift + conv.bias * scale
+    with torch.no_grad():
+        fused.weight.copy_(conv.weight * scale.reshape(-1, 1, 1, 1))
+        fused.bias.copy_(shift)
+    return fused.to(conv.weight.device)
+
+
+def fold_bn(model):
+    """ inference-only copy of an iRevNet (or a DataParallel of one) with the
+    batchnorms that follow a convolution in the bottleneck blocks folded into
+    it and dropout removed, forward and inverse are unchanged """
+    model = copy.deepcopy(model).eval()
+    net = model.module if isinstance(model, nn.DataParallel) else model
+    for block in net.stack:
+        layers = []
+        for layer in block.bottleneck_block:
+            if isinstance(layer, nn.Dropout):
+                continue
+            if isinstance(layer, nn.BatchNorm2d) and layers and \
+                    isinstance(layers[-1], nn.Conv2d):
+                layers[-1] = fuse_conv_bn(layers[-1], layer)
+            else:
+                layers.append(layer)
+        block.bottleneck_block = nn.Sequential(*layers)
+    for p in model.parameters():
+        p.requires_grad_(False)
+    return model
+
+
+
+# Container copy of the wire protocol (see wire.py): this module is pickled
+# by value into the model container, so it cannot import the frontend's
+# wire module.
+WIRE_MAGIC = b'ACW'
+WIRE_VERSION = 1
+WIRE_CODES = {
+    torch.float32: 0,
+    torch.float16: 1,
+    torch.int8: 2,
+}
+WIRE_DTYPES = {code: dtype for dtype, code in WIRE_CODES.items()}
+WIRE_NP_DTYPES = {
+    0: np.dtype('<f4'),
+    1: np.dtype('<f2'),
+    2: np.dtype('<i1'),
+}
+
+QUERY_MAGIC = b'ACQ'
+QUERY_RETURN_BIJ = 1
+
+
+def encode_tensors(tensors, dtypes):
+    parts = [struct.pack("<3sBB", WIRE_MAGIC, WIRE_VERSION, len(tensors))]
+    offset = 5
+    for t, dtype in zip(tensors, dtypes):
+        t = t.detach().cpu()
+        scale = b''
+        if dtype == torch.int8:
+            s = t.abs().max().item() / 127.0
+            if s == 0:
+                s = 1.0
+            t = torch.round(t.float() / s).clamp(-127, 127)
+            scale = struct.pack("<f", s)
+        data = t.to(dtype).contiguous().numpy()
+        data = data.astype(data.dtype.newbyteorder('<'), copy=False)
+        header = struct.pack("<BB%dI" % data.ndim, WIRE_CODES[dtype], data.ndim, *data.shape) + scale
+        pad = -(offset + len(header)) % 8
+        parts += [header, b'\0' * pad, data.tobytes()]
+        offset += len(header) + pad + data.nbytes
+    return b''.join(parts)
+
+
+def decode_tensors(buf):
+    count = struct.unpack_from("<B", buf, 4)[0]
+    offset = 5
+    tensors = []
+    for _ in range(count):
+        code, ndim = struct.unpack_from("<BB", buf, offset)
+        offset += 2
+        shape = struct.unpack_from("<%dI" % ndim, buf, offset)
+        offset += 4 * ndim
+        scale = None
+        if WIRE_DTYPES[code] == torch.int8:
+            scale = struct.unpack_from("<f", buf, offset)[0]
+            offset += 4
+        offset += -offset % 8
+        dtype = WIRE_NP_DTYPES[code]
+        numel = int(np.prod(shape))
+        t = torch.from_numpy(np.frombuffer(buf, dtype=dtype, count=numel, offset=offset).astype(np.float32))
+        offset += numel * dtype.itemsize
+        if scale is not None:
+            t = t * scale
+        tensors.append(t.reshape(shape))
+    return tensors
+
+
+def decode_query(query):
+    # Returns (return_bij, bij_dtype, payload); plain payloads get both outputs
+    if bytes(query[:3]) != QUERY_MAGIC:
+        return True, torch.float32, query
+    flags, bij_code = struct.unpack_from("<BB", query, 4)
+    return bool(flags & QUERY_RETURN_BIJ), WIRE_DTYPES[bij_code], query[6:]
+
 
 min_img_size = 224
 
-def predict(model, inputs):
-    def _predict_one(one_input_arr):
-        try:
-            img = Image.open(io.BytesIO(one_input_arr))
+def predict(model, inputs, wire_dtype='float32'):
+    # Batched: Clipper hands over up to deploy_batch_size queries at once.
+    # Inputs are grouped by tensor shape and dtype only, so decoded images
+    # and tensor parities of the same shape share a batch. Each group runs
+    # through the model in a single forward pass, and the outputs are split
+    # back per query.
+    def _decode_one(one_input_arr):
+        return_bij, bij_dtype, payload = decode_query(one_input_arr)
+        if bytes(payload[:3]) == WIRE_MAGIC:
+            # raw tensor input (parity), no image decoding
+            img = decode_tensors(payload)[0]
+        else:
+            img = Image.open(io.BytesIO(payload))
             if img.mode != "RGB":
                 img = img.convert("RGB")
             # transform_pipeline = transforms.Compose([transforms.Resize(min_img_size),
@@ -214,22 +344,43 @@ def predict(model, inputs):
             #                                                 std=[0.229, 0.224, 0.225])])
             transform_pipeline = transforms.Compose([transforms.ToTensor()])
             img = transform_pipeline(img)
-            
-            # if torch.cuda.is_available():
-            #     img = img.cuda()
-            img = img.unsqueeze(0)
-            img = Variable(img)
-            out, out_bij = model(img)
-            
-            return [pickle.dumps(out.cpu().data),pickle.dumps(out_bij.cpu().data)]
+        return img, return_bij, bij_dtype
+
+    def _encode_one(out, out_bij, return_bij, bij_dtype):
+        if return_bij:
+            out_bytes = encode_tensors([out, out_bij], [getattr(torch, wire_dtype), bij_dtype])
+        else:
+            out_bytes = encode_tensors([out], [getattr(torch, wire_dtype)])
+        return base64.b64encode(out_bytes).decode()
 
+    outputs = [None] * len(inputs)
+    batches = {}
+    for i, one_input_arr in enumerate(inputs):
+        try:
+            img, return_bij, bij_dtype = _decode_one(one_input_arr)
+        except Exception as e:
+            print(e)
+            outputs[i] = e
+            continue
+        batches.setdefault((tuple(img.shape), img.dtype), []).append((i, img, return_bij, bij_dtype))
+
+    device = next(model.parameters()).device
+    for batch in batches.values():
+        try:
+            imgs = torch.stack([img for _, img, _, _ in batch]).to(device)
+            # no autograd graph, activations are freed block by block
+            with torch.no_grad():
+                out, out_bij = model(imgs)
+            for (i, _, return_bij, bij_dtype), o, o_bij in zip(batch, out, out_bij):
+                outputs[i] = _encode_one(o, o_bij, return_bij, bij_dtype)
         except Exception as e:
             print(e)
-            return e
-        
-    return [_predict_one(i) for i in inputs]
+            for i, _, _, _ in batch:
+                outputs[i] = e
+
+    return outputs
 
-def load_irevnet_model(model_path):
+def load_irevnet_model(model_path, fold=False):
     if os.path.isfile(model_path):
         print("=> loading checkpoint '{}'".format(model_path))
         model = iRevNet(nBlocks=[18, 18, 18], nStrides=[1, 2, 2],
@@ -242,6 +393,11 @@ def load_irevnet_model(model_path):
     
         model.load_state_dict(torch.load(model_path))
         print("=> loaded checkpoint '{}'".format(model_path))
+        # batched queries must not share batchnorm statistics
+        model.eval()
+        if fold:
+            model = fold_bn(model)
+            print("=> folded batchnorm into convolutions")
         return model
     else:
         print("=> no checkpoint found at '{}'".format(model_path))
@@ -253,7 +409,7 @@ class ClipperDeployer:
         self.conf = conf
 
     def deploy(self):
-        model = load_irevnet_model(self.conf.cfg['model_checkpoint'])
+        model = load_irevnet_model(self.conf.cfg['model_checkpoint'], self.conf.cfg['fold_bn'])
         # model = resnet50(pretrained=True)
 
         try:
@@ -273,10 +429,11 @@ class ClipperDeployer:
                                             name=model_name,
                                             version='1',
                                             input_type='bytes',
-                                            func=predict,
+                                            func=functools.partial(predict, wire_dtype=self.conf.cfg['wire_dtype']),
                                             pytorch_model=model,
                                             num_replicas=1,
-                                            batch_size=1,  # Disable adaptive batching policy
+                                            # at most this many queries per predict call, 1 disables adaptive batching
+                                            batch_size=self.conf.cfg['deploy_batch_size'],
                                             pkgs_to_install=['pillow'])
 
         clipper_conn.register_application(name=app_name,
@@ -2,7 +2,8 @@ import config
 import torch
 from encoder import LinearEncoder, ConvEncoder, ConcatEncoder, MLPEncoder
 from decoder import LinearDecoder, DistilledDecoder, MLPDecoder
-from util import in_dim, out_dim, decode_in_dim
+from util import in_dim, out_dim, decode_in_dim, inference_mode
+from linear_code import parity_weights
 from models.iRevNet import iRevNet16x64, iRevNet48x64
 
 coder_models = {
@@ -14,41 +15,70 @@ class Coder:
     def __init__(self, conf) -> None:
         self.conf = conf
         self.ec_k = conf.cfg['ec_k']
+        self.ec_r = conf.cfg['ec_r']
         
-        # construct encoder
+        # construct encoder: the linear code computes all r parities in one
+        # reduction, the learned encoders produce a single parity (r = 1)
         if conf.cfg['encoder'] == 'linear':
-            self.encoder = LinearEncoder(ec_k=self.ec_k, in_dim=in_dim[conf.cfg['dataset']])
-        elif conf.cfg['encoder'] == 'conv':
-            self.encoder = ConvEncoder(ec_k=self.ec_k, in_dim=in_dim[conf.cfg['dataset']])
-        elif conf.cfg['encoder'] == 'concat_crop':
-            self.encoder = ConcatEncoder(ec_k=self.ec_k, in_dim=in_dim[conf.cfg['dataset']], type = "crop")
-        elif conf.cfg['encoder'] == 'concat_resize':
-            self.encoder = ConcatEncoder(ec_k=self.ec_k, in_dim=in_dim[conf.cfg['dataset']], type = "resize")
-        elif conf.cfg['encoder'] == 'mlp':
-            self.encoder = MLPEncoder(ec_k=self.ec_k, in_dim=in_dim[conf.cfg['dataset']])
+            self.encoder = LinearEncoder(ec_k=self.ec_k, in_dim=in_dim[conf.cfg['dataset']],
+                                         weights=parity_weights(self.ec_k, self.ec_r))
         else:
-            raise NotImplementedError("Not implemented Encoder Type: " + conf.cfg['encoder'])
+            self.encoder = self.make_encoder(conf)
+        self.single_parity = conf.cfg['encoder'] != 'linear'
         
         # construct decoder
         if conf.cfg['decoder'] == 'linear':
-            self.decoder = LinearDecoder(ec_k = self.ec_k)
+            self.decoder = LinearDecoder(ec_k = self.ec_k, ec_r = self.ec_r)
         elif conf.cfg['decoder'] == 'mlp':
-            self.decoder = MLPDecoder(ec_k = self.ec_k, in_dim=out_dim[conf.cfg['dataset']])
+            self.decoder = MLPDecoder(ec_k = self.ec_k, in_dim=out_dim[conf.cfg['dataset']], device = conf.cfg['decode_device'],
+                                      jit = conf.cfg['decoder_jit'])
         elif conf.cfg['decoder'] == 'distill':
             path = conf.cfg['decoder_checkpoint']
             print("=> loading distill model '{}'".format(path))
             model = coder_models[conf.cfg['decoder_model']]()
-            model.load_state_dict(torch.load(path))
-            if torch.cuda.is_available():
-                model = model.cuda()
+            model.load_state_dict(torch.load(path, map_location='cpu'))
             print("=> loaded distill model '{}'".format(path))
             
-            self.decoder = DistilledDecoder(ec_k = self.ec_k, model = model)
+            # warm up (and trace) on the out_bij of k survivors
+            dim = decode_in_dim[conf.cfg['dataset']]
+            example = torch.zeros([1, dim[0] * self.ec_k] + dim[1:])
+            self.decoder = DistilledDecoder(ec_k = self.ec_k, model = model, ec_r = self.ec_r,
+                                            device = conf.cfg['decode_device'],
+                                            jit = conf.cfg['decoder_jit'], example = example)
         else:
             raise NotImplementedError("Not implemented Decoder type: " + conf.cfg['decoder'])
     
+    def make_encoder(self, conf):
+        if conf.cfg['encoder'] == 'conv':
+            return ConvEncoder(ec_k=self.ec_k, in_dim=in_dim[conf.cfg['dataset']])
+        elif conf.cfg['encoder'] == 'concat_crop':
+            return ConcatEncoder(ec_k=self.ec_k, in_dim=in_dim[conf.cfg['dataset']], type = "crop")
+        elif conf.cfg['encoder'] == 'concat_resize':
+            return ConcatEncoder(ec_k=self.ec_k, in_dim=in_dim[conf.cfg['dataset']], type = "resize")
+        elif conf.cfg['encoder'] == 'mlp':
+            return MLPEncoder(ec_k=self.ec_k, in_dim=in_dim[conf.cfg['dataset']])
+        else:
+            raise NotImplementedError("Not implemented Encoder Type: " + conf.cfg['encoder'])
+    
+    @inference_mode()
     def encode(self, input):
+        # [k, C, H, W] --> [r, C, H, W]
+        if self.single_parity:
+            return self.encoder(input).unsqueeze(0)
         return self.encoder(input)
     
+    @inference_mode()
+    def encode_batch(self, input, out=None):
+        # [G, k, C, H, W] --> [G, r, C, H, W], into out if given
+        if not self.single_parity:
+            return self.encoder.encode_batch(input, out=out)
+        parities = self.encoder.encode_batch(input).unsqueeze(1)
+        if out is None:
+            return parities
+        return out.copy_(parities.detach())
+    
     def decode(self, input):
-        return self.decoder(input)
\ No newline at end of file
+        return self.decoder(input)
+    
+    def decode_batch(self, input):
+        return self.decoder.decode_batch(input)
\ No newline at end of file
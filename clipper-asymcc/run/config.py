@@ -5,7 +5,56 @@ class Config:
         with open(path, 'r') as infile:
             cfg = json.load(infile)
         
+        cfg.setdefault('ec_r', 1)
+        cfg.setdefault('max_inflight', 10)
+        cfg.setdefault('encode_batch_size', 1)
+        cfg.setdefault('encode_batch_window_ms', 2)
+        cfg.setdefault('dispatch', 'serial')
+        cfg.setdefault('placement', 'pinned')
+        cfg.setdefault('placement_anti_affinity', False)
+        cfg.setdefault('placement_ewma_alpha', 0.2)
+        cfg.setdefault('group_wait_ms', 50)
+        cfg.setdefault('partial_group', 'pad')
+        cfg.setdefault('repair_batch_size', 1)
+        cfg.setdefault('repair_batch_window_ms', 5)
+        cfg.setdefault('repair_procs', 0)
+        # 'auto' decodes on CUDA when available
+        cfg.setdefault('decode_device', 'auto')
+        # 'trace' or 'script' compiles and freezes the decoder model
+        cfg.setdefault('decoder_jit', 'none')
+        cfg.setdefault('straggler_mode', 'deadline')
+        cfg.setdefault('deadline_quantile', 0.95)
+        cfg.setdefault('deadline_init_ms', 100)
+        # hard limit on a group, then it is repaired or dropped as it is
+        cfg.setdefault('group_timeout_ms', 10000)
+        cfg.setdefault('engine', 'thread')
+        cfg.setdefault('async_conn_limit', 100)
+        # a query without a reply by then fails and is repaired
+        cfg.setdefault('request_timeout_ms', 5000)
+        # "group" fails one query per group, "per_query" fails each query
+        # independently and can exercise r > 1 parities
+        cfg.setdefault('fail_mode', 'group')
+        cfg.setdefault('per_query_fail_rate', 0.0)
+        # serve the model with its batchnorms folded into the convolutions
+        cfg.setdefault('fold_bn', False)
+        # queries per predict call in the container (Clipper adaptive batching)
+        cfg.setdefault('deploy_batch_size', 1)
+        cfg.setdefault('wire_dtype', 'float32')
+        cfg.setdefault('parity_format', 'tensor')
+        # out_bij is only needed by the distilled decoder: "eager" returns it
+        # with every reply, "lazy" fetches it only for groups in repair
+        cfg.setdefault('bij_fetch', 'eager' if cfg['decoder'] == 'distill' else 'none')
+        cfg.setdefault('bij_dtype', 'float16')
+        
         self.cfg = cfg
         self.num_worker = len(cfg['worker_ips'])
         
-        assert(cfg['fail_rate'] * cfg['ec_k'] <= 1)
\ No newline at end of file
+        assert(cfg['fail_mode'] in ('group', 'per_query'))
+        assert(cfg['fail_mode'] != 'group' or cfg['fail_rate'] * cfg['ec_k'] <= 1)
+        assert(0 <= cfg['per_query_fail_rate'] <= 1)
+        assert(cfg['ec_r'] >= 1)
+        # only the linear code has independent parities, the MLP decoder
+        # is built for a single one
+        assert(cfg['ec_r'] == 1 or cfg['encoder'] == 'linear')
+        assert(cfg['ec_r'] == 1 or cfg['decoder'] != 'mlp')
+        assert(cfg['decoder'] != 'distill' or cfg['bij_fetch'] != 'none')
\ No newline at end of file
@@ -1,35 +1,149 @@
 import torch
 import torch.nn as nn
-from util import try_cuda, get_flattened_dim
-import numpy as np
+from util import try_cuda, get_flattened_dim, inference_mode
+import linear_code
+
+# Decoders repair the output of a missing data query from the outputs of a
+# group of k data queries and r parities. Their input is (out, outbij,
+# missing, target): out [k+r, 10] with zeros for missing members, the
+# out_bij the decoder works from (or None), missing [k+r] bool and the data
+# index to repair. decode_batch takes the same with a leading group
+# dimension, except that outbij is a list of per-group tensors or None.
+
+class DecodeEngine:
+    # Runs a decoder model on the decode device. On CUDA, a batch is split
+    # into chunks that are staged through a ring of reusable pinned host
+    # buffers and copied to the device on a dedicated stream, so the copy of
+    # one chunk overlaps the compute of the previous one. On CPU the model
+    # runs on the inputs directly. Either way run() takes and returns CPU
+    # tensors.
+    #
+    # The model is put in eval mode and, given an example input, optionally
+    # traced ("trace") or scripted ("script") and frozen, then warmed up so
+    # that the first repair does not pay for lazy initialisation.
+    def __init__(self, model, device='auto', chunk=16, ring=3, jit='none', example=None, warmup=3) -> None:
+        if device == 'auto':
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        if device == 'cuda' and not torch.cuda.is_available():
+            print("CUDA is not available, decoding on CPU")
+            device = 'cpu'
+        self.device = torch.device(device)
+        self.model = model.to(self.device).eval()
+        self.chunk = chunk
+        if self.device.type == 'cuda':
+            self.stream = torch.cuda.Stream(self.device)
+            self.ring = [None] * ring
+            self.copied = [None] * ring
+            self.slot = 0
+        
+        if jit != 'none':
+            self.model = self.compile(jit, example)
+        if example is not None:
+            for _ in range(warmup):
+                self.run(example)
+    
+    def compile(self, jit, example):
+        try:
+            with torch.no_grad():
+                if jit == 'trace':
+                    compiled = torch.jit.trace(self.model, example.to(self.device), check_trace=False)
+                else:
+                    compiled = torch.jit.script(self.model)
+                return torch.jit.freeze(compiled.eval())
+        except Exception as e:
+            print("jit {} failed, decoding eagerly:".format(jit), repr(e))
+            return self.model
+    
+    def output(self, y):
+        # the logits of models that return (logits, features)
+        return y[0] if isinstance(y, tuple) else y
+    
+    def stage(self, x):
+        # x --> next pinned buffer --> device, on the copy stream
+        slot = self.slot
+        self.slot = (slot + 1) % len(self.ring)
+        if self.copied[slot] is not None:
+            # the buffer is free once its last copy has finished
+            self.copied[slot].synchronize()
+        buf = self.ring[slot]
+        if buf is None or buf.numel() < x.numel() or buf.dtype != x.dtype:
+            buf = torch.empty(x.numel(), dtype=x.dtype).pin_memory()
+            self.ring[slot] = buf
+        host = buf[:x.numel()].view_as(x)
+        host.copy_(x)
+        with torch.cuda.stream(self.stream):
+            dev = host.to(self.device, non_blocking=True)
+            self.copied[slot] = torch.cuda.Event()
+            self.copied[slot].record(self.stream)
+        return dev, self.copied[slot]
+    
+    @inference_mode()
+    def run(self, x):
+        if self.device.type != 'cuda':
+            return self.output(self.model(x.to(self.device)))
+        
+        staged = [self.stage(x[i:i + self.chunk]) for i in range(0, len(x), self.chunk)]
+        compute = torch.cuda.current_stream(self.device)
+        ys = []
+        for dev, copied in staged:
+            compute.wait_event(copied)
+            dev.record_stream(compute)
+            ys.append(self.output(self.model(dev)))
+        return torch.cat(ys, dim=0).cpu()
 
 class Decoder():
-    def __init__(self, ec_k) -> None:
+    def __init__(self, ec_k, ec_r=1) -> None:
         self.ec_k = ec_k
+        self.ec_r = ec_r
 
     def __call__(self):
         pass
     
+    def decode_batch(self, input):
+        # out: [G, k+r, 10] --> [G, 10]
+        out, outbij, missing, target = input
+        return torch.stack([self((out[g], outbij[g], missing[g], target[g])) for g in range(len(out))], dim=0)
+    
 class LinearDecoder(Decoder):
+    # Treats the outputs as linear in the inputs: the available data outputs
+    # and the parity outputs (parity j ~ sum_i w[j,i] * out_i) are solved,
+    # in the least-squares sense, for all k data outputs at once
+    def __init__(self, ec_k, ec_r=1) -> None:
+        super().__init__(ec_k, ec_r)
+        self.weights = linear_code.parity_weights(ec_k, ec_r)
+
     def __call__(self, input):
-        out, outbij = input
-        return out[-1] * self.ec_k - torch.sum(out[:-1], dim=0)
+        out, outbij, missing, target = input
+        return self.decode_batch((out.unsqueeze(0), [outbij], missing.unsqueeze(0), torch.tensor([target])))[0]
     
-class DistilledDecoder(Decoder):
-    def __init__(self, ec_k, model) -> None:
-        super().__init__(ec_k)
-        self.model = model
+    def decode_batch(self, input):
+        out, outbij, missing, target = input
+        x = linear_code.solve(out, missing, self.weights)  # [G, k, 10]
+        return x[torch.arange(len(out)), target]
+    
+class DistilledDecoder(LinearDecoder):
+    # The distilled model repairs one missing data output from the out_bij
+    # of the k-1 other data queries and parity 0; other repairs fall back to
+    # the linear solve
+    def __init__(self, ec_k, model, ec_r=1, device='auto', jit='none', example=None) -> None:
+        super().__init__(ec_k, ec_r)
+        self.engine = DecodeEngine(model, device, jit=jit, example=example)
         
-    def __call__(self, input):
-        out, outbij = input
-        outbij = outbij.unsqueeze(0)
-        if torch.cuda.is_available():
-            outbij = outbij.cuda()
-        y, _ = self.model(outbij)
-        return y.cpu().data[0]
+    def decode_batch(self, input):
+        out, outbij, missing, target = input
+        distilled = [g for g in range(len(out)) if outbij[g] is not None]
+        if len(distilled) == len(out):
+            return self.distill(outbij)
+        resp = super().decode_batch(input)
+        if distilled:
+            resp[distilled] = self.distill([outbij[g] for g in distilled])
+        return resp
+    
+    def distill(self, outbij):
+        return self.engine.run(torch.stack(outbij, dim=0)).data
 
 class MLPDecoder(Decoder):
-    def __init__(self, ec_k, in_dim):
+    def __init__(self, ec_k, in_dim, device='auto', jit='none'):
         super().__init__(ec_k)
         self.inout_dim = in_dim[0] # 10
         num_in = self.ec_k + 1
@@ -66,14 +180,16 @@ class MLPDecoder(Decoder):
             nn.Linear(in_features=num_in * self.inout_dim,
                       out_features=num_out * self.inout_dim)
         )
+        self.engine = DecodeEngine(self.nn, device, jit=jit,
+                                   example=torch.zeros(1, num_in * self.inout_dim))
 
     def __call__(self, input): 
-        out, outbij = input
-        fail = -1
-        for i,data in enumerate(out):
-            if np.count_nonzero(data) == 0:
-                fail = i
-        val = out.view(-1) #[(k+1), 10] --> [(k+1)*10]
-        y = self.nn(val)  # --> [k*10]
-        y = y.view(self.ec_k, -1) # --> [k, 10]
-        return y.data[fail]
+        out, outbij, missing, target = input
+        return self.decode_batch((out.unsqueeze(0), [outbij], missing.unsqueeze(0), torch.tensor([target])))[0]
+    
+    def decode_batch(self, input):
+        out, outbij, missing, target = input
+        val = out.reshape(len(out), -1) #[G, k+1, 10] --> [G, (k+1)*10]
+        y = self.engine.run(val)  # --> [G, k*10]
+        y = y.view(len(out), self.ec_k, -1) # --> [G, k, 10]
+        return y.data[torch.arange(len(out)), target]
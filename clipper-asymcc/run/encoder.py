@@ -3,6 +3,7 @@ import torch.nn as nn
 import torchvision.transforms as transforms
 from util import try_cuda, get_flattened_dim
 from torch import Tensor
+import linear_code
 
 class Encoder:
     def __init__(self, ec_k, in_dim) -> None:
@@ -12,10 +13,23 @@ class Encoder:
     def __call__(self):
         pass
 
+    def encode_batch(self, input):
+        # [G, k, C, H, W] --> [G, C, H, W]
+        return torch.stack([self(group) for group in input], dim=0)
+
 class LinearEncoder(Encoder):
+    def __init__(self, ec_k, in_dim, weights=None) -> None:
+        super().__init__(ec_k, in_dim)
+        # weights of the data images: None for the plain average, [k] for
+        # one parity or [r, k] for r parities at once
+        self.weights = weights
+
     def __call__(self, input):
         assert(len(input) == self.ec_k)
-        return torch.sum((1/self.ec_k)*input, dim=0)
+        return self.encode_batch(input.unsqueeze(0))[0]
+
+    def encode_batch(self, input, out=None):
+        return linear_code.encode(input, self.weights, out=out)
 
 class ConvEncoder(Encoder):
     def __init__(self, ec_k, in_dim, intermediate_channels_multiplier=3) -> None:
@@ -60,9 +74,12 @@ class ConvEncoder(Encoder):
         )
         
     def __call__(self, input):
-        val = input.view(-1, self.ec_k, self.in_dim[1], self.in_dim[2])  #[k, 3, 32, 32] --> [3, k, 32, 32]
-        out = self.nn(val) #[3, 1, 32, 32]
-        out = out.reshape(self.in_dim)
+        return self.encode_batch(input.unsqueeze(0))[0]
+
+    def encode_batch(self, input):
+        val = input.reshape(-1, self.ec_k, self.in_dim[1], self.in_dim[2])  #[G, k, 3, 32, 32] --> [G*3, k, 32, 32]
+        out = self.nn(val) #[G*3, 1, 32, 32]
+        out = out.reshape([len(input)] + list(self.in_dim))
         return out
     
 class ConcatEncoder(Encoder):
@@ -135,14 +152,15 @@ class MLPEncoder(Encoder):
         )
         
     def __call__(self, input):
+        return self.encode_batch(input.unsqueeze(0))[0]
+
+    def encode_batch(self, input):
         # Flatten inputs
-        val = input.view(input.size(1), -1)  #[k, 3, 32, 32] --> [3, k*32*32]
+        val = input.reshape(-1, self.ec_k * self.inout_dim)  #[G, k, 3, 32, 32] --> [G*3, k*32*32]
         
         # Perform inference over encoder model
-        # The MLP encoder operates over different channels of input images independently.
-        out_list = []
-        for _,data in enumerate(val):
-            out_list.append(self.nn(data))
-        out = torch.stack(out_list, dim=0)
-        out = out.view(self.in_dim)
+        # The MLP encoder operates over different channels of input images independently,
+        # so all channels of all groups go through in one batch.
+        out = self.nn(val)
+        out = out.view([len(input)] + list(self.in_dim))
         return out
\ No newline at end of file
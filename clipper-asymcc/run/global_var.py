@@ -2,7 +2,7 @@ from queue import Queue
 import threading
 from concurrent.futures import ThreadPoolExecutor
 
-def queue_init(length):
+def queue_init(length, req_pool_size=20):
     # global origin_queue
     global task_queue
     global decode_queue
@@ -10,7 +10,7 @@ def queue_init(length):
     global resp_port
     global resp_len
     global FLAG_STOP_THREAD
-    # global clipper_req_pool
+    global clipper_req_pool
     
     # origin_queue = Queue(10000)
     task_queue = Queue(10000)
@@ -20,7 +20,7 @@ def queue_init(length):
     resp_len = length
     FLAG_STOP_THREAD = False
     
-    # clipper_req_pool = ThreadPoolExecutor(max_workers=20)
+    clipper_req_pool = ThreadPoolExecutor(max_workers=req_pool_size)
 
 
 # def origin_queue_put(temp):
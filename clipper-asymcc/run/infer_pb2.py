@@ -14,12 +14,13 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0binfer.proto\"I\n\x0cInferRequest\x12\n\n\x02id\x18\x01 \x01(\x05\x12\r\n\x05input\x18\x02 \x01(\x0c\x12\x0c\n\x04port\x18\x03 \x01(\x05\x12\x10\n\x08identity\x18\x04 \x01(\t\"\x1f\n\rInferResponse\x12\x0e\n\x06output\x18\x01 \x01(\t27\n\x0bGrpcService\x12(\n\x05infer\x12\r.InferRequest\x1a\x0e.InferResponse\"\x00\x42\x03\x80\x01\x01\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0binfer.proto\"^\n\x0cInferRequest\x12\n\n\x02id\x18\x01 \x01(\x05\x12\r\n\x05input\x18\x02 \x01(\x0c\x12\x0c\n\x04port\x18\x03 \x01(\x05\x12\x10\n\x08identity\x18\x04 \x01(\t\x12\x13\n\x0b\x64\x65\x61\x64line_ms\x18\x05 \x01(\x05\"\x1f\n\rInferResponse\x12\x0e\n\x06output\x18\x01 \x01(\t\"9\n\x0bInferResult\x12\n\n\x02id\x18\x01 \x01(\x05\x12\r\n\x05label\x18\x02 \x01(\x05\x12\x0f\n\x07\x65xpired\x18\x03 \x01(\x08\x32\x64\n\x0bGrpcService\x12(\n\x05infer\x12\r.InferRequest\x1a\x0e.InferResponse\"\x00\x12+\n\x06stream\x12\r.InferRequest\x1a\x0c.InferResult\"\x00(\x01\x30\x01\x42\x03\x80\x01\x01\x62\x06proto3')
 
 
 
 _INFERREQUEST = DESCRIPTOR.message_types_by_name['InferRequest']
 _INFERRESPONSE = DESCRIPTOR.message_types_by_name['InferResponse']
+_INFERRESULT = DESCRIPTOR.message_types_by_name['InferResult']
 InferRequest = _reflection.GeneratedProtocolMessageType('InferRequest', (_message.Message,), {
   'DESCRIPTOR' : _INFERREQUEST,
   '__module__' : 'infer_pb2'
@@ -34,15 +35,24 @@ InferResponse = _reflection.GeneratedProtocolMessageType('InferResponse', (_mess
   })
 _sym_db.RegisterMessage(InferResponse)
 
+InferResult = _reflection.GeneratedProtocolMessageType('InferResult', (_message.Message,), {
+  'DESCRIPTOR' : _INFERRESULT,
+  '__module__' : 'infer_pb2'
+  # @@protoc_insertion_point(class_scope:InferResult)
+  })
+_sym_db.RegisterMessage(InferResult)
+
 _GRPCSERVICE = DESCRIPTOR.services_by_name['GrpcService']
 if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
   DESCRIPTOR._serialized_options = b'\200\001\001'
   _INFERREQUEST._serialized_start=15
-  _INFERREQUEST._serialized_end=88
-  _INFERRESPONSE._serialized_start=90
-  _INFERRESPONSE._serialized_end=121
-  _GRPCSERVICE._serialized_start=123
-  _GRPCSERVICE._serialized_end=178
+  _INFERREQUEST._serialized_end=109
+  _INFERRESPONSE._serialized_start=111
+  _INFERRESPONSE._serialized_end=142
+  _INFERRESULT._serialized_start=144
+  _INFERRESULT._serialized_end=201
+  _GRPCSERVICE._serialized_start=203
+  _GRPCSERVICE._serialized_end=303
 # @@protoc_insertion_point(module_scope)
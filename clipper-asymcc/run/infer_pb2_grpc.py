@@ -19,6 +19,11 @@ class GrpcServiceStub(object):
                 request_serializer=infer__pb2.InferRequest.SerializeToString,
                 response_deserializer=infer__pb2.InferResponse.FromString,
                 )
+        self.stream = channel.stream_stream(
+                '/GrpcService/stream',
+                request_serializer=infer__pb2.InferRequest.SerializeToString,
+                response_deserializer=infer__pb2.InferResult.FromString,
+                )
 
 
 class GrpcServiceServicer(object):
@@ -30,6 +35,13 @@ class GrpcServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def stream(self, request_iterator, context):
+        """Queries in, results out as soon as each is predicted or repaired
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_GrpcServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -38,6 +50,11 @@ def add_GrpcServiceServicer_to_server(servicer, server):
                     request_deserializer=infer__pb2.InferRequest.FromString,
                     response_serializer=infer__pb2.InferResponse.SerializeToString,
             ),
+            'stream': grpc.stream_stream_rpc_method_handler(
+                    servicer.stream,
+                    request_deserializer=infer__pb2.InferRequest.FromString,
+                    response_serializer=infer__pb2.InferResult.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'GrpcService', rpc_method_handlers)
@@ -64,3 +81,20 @@ class GrpcService(object):
             infer__pb2.InferResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def stream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/GrpcService/stream',
+            infer__pb2.InferRequest.SerializeToString,
+            infer__pb2.InferResult.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
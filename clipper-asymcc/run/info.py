@@ -1,4 +1,6 @@
 import numpy as np
+import threading
+from collections import deque
 
 class TimeSeries:
     # Time series satisfying the Poisson distribution, and sum is 1
@@ -16,6 +18,8 @@ class Info:
         self.inferTime = []
         self.encodeTime = []
         self.decodeTime = []
+        self.repairTime = []
+        self.repairBatch = []
         self.totalTime = 0
     
     def add_infertime(self,t):
@@ -27,6 +31,13 @@ class Info:
     def add_decodetime(self,t):
         self.decodeTime.append(t)
     
+    def add_repairtime(self,t):
+        # from the repair being queued to its result being returned
+        self.repairTime.append(t)
+    
+    def add_repairbatch(self,n,t):
+        self.repairBatch.append((n, t))
+    
     def set_totaltime(self,t):
         self.totalTime = t
     
@@ -53,6 +64,15 @@ class Info:
             print("no fail")
         else:
             print(np.mean(self.decodeTime))
+        if len(self.repairTime) > 0:
+            print("Mean(repair latency):")
+            print(np.mean(self.repairTime))
+        if len(self.repairBatch) > 0:
+            sizes, times = zip(*self.repairBatch)
+            print("Mean(repair batch size):")
+            print(np.mean(sizes))
+            print("Repair throughput (repairs/s):")
+            print(sum(sizes) / sum(times) * 1000.0)
         print("----------------------------------")
         print("total time:")
         print(self.totalTime)
@@ -60,6 +80,28 @@ class Info:
 
 INFO = Info()
 
+
+class LatencyTracker:
+    # Sliding window of observed per-query latencies (ms), shared by all workers
+    def __init__(self, window=1000, min_samples=20) -> None:
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+    
+    def add(self, t):
+        with self.lock:
+            self.samples.append(t)
+    
+    def quantile(self, q):
+        # None until enough samples have been observed
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            samples = list(self.samples)
+        return np.percentile(samples, q * 100.0)
+
+LATENCY = LatencyTracker()
+
 class ImageInfo:
     def __init__(self, id, fpath):
         self.id = id
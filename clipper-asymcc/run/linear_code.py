@@ -0,0 +1,55 @@
+import numpy as np
+import torch
+
+# Linear coding kernels over batches of groups. A batch is [G, k, ...]: G
+# groups of k inputs each. Everything runs on the device of the input, and
+# the results can be written into caller-provided buffers.
+#
+# model/src/distill/models/linear_code.py has a copy of parity_weights and
+# encode for training, keep both in sync.
+
+
+def parity_weights(ec_k, ec_r):
+    # [r, k] weights of the linear parities: parity j is sum_i (i+1)^j * x_i,
+    # normalised so that every row sums to 1 (parity 0 is the plain average).
+    # Any square choice of rows and columns is a nonsingular (generalised)
+    # Vandermonde matrix, so any r missing outputs can be solved for.
+    nodes = torch.arange(1, ec_k + 1, dtype=torch.float64)
+    w = torch.stack([nodes ** j for j in range(ec_r)], dim=0)
+    return (w / w.sum(dim=1, keepdim=True)).float()
+
+
+def encode(input, weights=None, out=None):
+    # [G, k, ...] --> [G, ...] for the average (weights None) or one parity
+    # (weights [k]), [G, r, ...] for r parities (weights [r, k])
+    if weights is None:
+        return torch.mean(input, dim=1, out=out)
+    g, k = input.shape[:2]
+    w = weights.to(input.device, input.dtype)
+    shape = (g,) + tuple(w.shape[:-1]) + tuple(input.shape[2:])
+    if out is None:
+        out = input.new_empty(shape)
+    torch.matmul(w, input.reshape(g, k, -1), out=out.view((g,) + tuple(w.shape[:-1]) + (-1,)))
+    return out
+
+
+def solve(out, missing, weights):
+    # Least-squares estimate of all k data outputs of every group from the
+    # available ones and the parities (parity j ~ sum_i weights[j,i] * out_i).
+    # out: [G, k+r, ...] with anything in the missing rows, missing: [G, k+r]
+    # bool --> [G, k, ...]. With more than r missing the system is
+    # underdetermined and ValueError is raised.
+    g, n = out.shape[:2]
+    k = weights.shape[1]
+    if int(missing.sum(dim=1).max()) > n - k:
+        raise ValueError("More than {} of {} outputs missing, cannot solve".format(n - k, n))
+    system = torch.cat([torch.eye(k), weights], dim=0).to(out.device, out.dtype)  # [k+r, k]
+    avail = (~missing).to(out.device, out.dtype).unsqueeze(-1)  # [G, k+r, 1]
+    b = out.reshape(g, n, -1) * avail
+    a = system.unsqueeze(0) * avail
+    if hasattr(torch, 'linalg') and hasattr(torch.linalg, 'lstsq'):
+        x = torch.linalg.lstsq(a, b).solution  # [G, k, D]
+    else:
+        # torch < 1.9 has no batched least squares, use the pseudo-inverse
+        x = torch.from_numpy(np.linalg.pinv(a.cpu().numpy()) @ b.cpu().numpy()).to(out.device)
+    return x.reshape((g, k) + tuple(out.shape[2:]))
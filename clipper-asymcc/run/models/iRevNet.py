@@ -6,6 +6,8 @@ ICLR, 2018
 (c) Joern-Henrik Jacobsen, 2018
 """
 
+import contextlib
+import copy
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -58,7 +60,8 @@ class irevnet_block(nn.Module):
         if self.stride == 2:
             x1 = self.psi.forward(x1)
             x2 = self.psi.forward(x2)
-        y1 = Fx2 + x1
+        # Fx2 is a fresh conv output, y1 = Fx2 + x1 reuses its storage
+        y1 = Fx2.add_(x1)
         return (x2, y1)
 
     def inverse(self, x):
@@ -66,8 +69,8 @@ class irevnet_block(nn.Module):
         x2, y1 = x[0], x[1]
         if self.stride == 2:
             x2 = self.psi.inverse(x2)
-        Fx2 = - self.bottleneck_block(x2)
-        x1 = Fx2 + y1
+        Fx2 = self.bottleneck_block(x2)
+        x1 = Fx2.neg_().add_(y1)
         if self.stride == 2:
             x1 = self.psi.inverse(x1)
         if self.pad != 0 and self.stride == 1:
@@ -80,10 +83,102 @@ class irevnet_block(nn.Module):
         return x
 
 
+def _block_params(block):
+    # weights and biases of a block, also on DataParallel replicas whose
+    # parameters are plain tensors
+    params = []
+    for m in block.modules():
+        for name in ('weight', 'bias'):
+            p = getattr(m, name, None)
+            if isinstance(p, torch.Tensor) and p.requires_grad:
+                params.append(p)
+    return params
+
+
+def _rng_state(x):
+    cuda_state = torch.cuda.get_rng_state(x.device) if x.is_cuda else None
+    return torch.get_rng_state(), cuda_state, x.device
+
+
+@contextlib.contextmanager
+def _replay(rng):
+    """ same dropout masks as in the forward pass """
+    cpu_state, cuda_state, device = rng
+    with torch.random.fork_rng(devices=[device] if cuda_state is not None else []):
+        torch.set_rng_state(cpu_state)
+        if cuda_state is not None:
+            torch.cuda.set_rng_state(cuda_state, device)
+        yield
+
+
+def _running_stats(block):
+    return [(m, m.running_mean.clone(), m.running_var.clone(),
+             m.num_batches_tracked.clone()) for m in block.modules()
+            if isinstance(m, nn.BatchNorm2d) and m.track_running_stats]
+
+
+def _restore_running_stats(stats):
+    # the recomputation must not count as another batch
+    for m, mean, var, num in stats:
+        m.running_mean.copy_(mean)
+        m.running_var.copy_(var)
+        m.num_batches_tracked.copy_(num)
+
+
+class _ReversibleStack(torch.autograd.Function):
+    """ runs the blocks without keeping their activations, backward
+    reconstructs the input of every block from its output with inverse and
+    recomputes the block from there (RevNet) """
+
+    @staticmethod
+    def forward(ctx, x, stack, n, *params):
+        ctx.stack = stack
+        ctx.params = params
+        ctx.rng = []
+        with torch.no_grad():
+            out = (x[:, :n, :, :], x[:, n:, :, :])
+            for block in stack:
+                ctx.rng.append(_rng_state(x))
+                out = block.forward(out)
+            out_bij = merge(out[0], out[1])
+        ctx.save_for_backward(out_bij)
+        return out_bij
+
+    @staticmethod
+    def backward(ctx, grad_bij):
+        out_bij, = ctx.saved_tensors
+        out = split(out_bij)
+        grad = split(grad_bij)
+        param_grads = {}
+        for block, rng in zip(reversed(ctx.stack), reversed(ctx.rng)):
+            stats = _running_stats(block)
+            with torch.no_grad(), _replay(rng):
+                x = block.inverse(out)
+            x = tuple(t.detach().requires_grad_() for t in x)
+            params = _block_params(block)
+            with torch.enable_grad(), _replay(rng):
+                y = block.forward(x)
+            grads = torch.autograd.grad(y, x + tuple(params), grad, allow_unused=True)
+            _restore_running_stats(stats)
+            grad = grads[:2]
+            for p, g in zip(params, grads[2:]):
+                param_grads[id(p)] = g
+            out = tuple(t.detach() for t in x)
+            del x, y
+        return (merge(grad[0], grad[1]), None, None) + \
+            tuple(param_grads.get(id(p)) for p in ctx.params)
+
+
 class iRevNet(nn.Module):
+    # low_memory: while training, keep no block activations and recompute
+    # them from the block outputs in backward
+    low_memory = False
+
     def __init__(self, nBlocks, nStrides, nClasses, nChannels=None, init_ds=2,
-                 dropout_rate=0., affineBN=True, in_shape=None, mult=4):
+                 dropout_rate=0., affineBN=True, in_shape=None, mult=4,
+                 low_memory=False):
         super(iRevNet, self).__init__()
+        self.low_memory = low_memory
         self.ds = in_shape[2]//2**(nStrides.count(2)+init_ds//2)
         self.init_ds = init_ds
         self.in_ch = in_shape[0] * 2**self.init_ds
@@ -127,10 +222,14 @@ class iRevNet(nn.Module):
         n = self.in_ch//2
         if self.init_ds != 0:
             x = self.init_psi.forward(x)
-        out = (x[:, :n, :, :], x[:, n:, :, :])
-        for block in self.stack:
-            out = block.forward(out)
-        out_bij = merge(out[0], out[1])
+        if self.low_memory and torch.is_grad_enabled():
+            params = [p for block in self.stack for p in _block_params(block)]
+            out_bij = _ReversibleStack.apply(x, self.stack, n, *params)
+        else:
+            out = (x[:, :n, :, :], x[:, n:, :, :])
+            for block in self.stack:
+                out = block.forward(out)
+            out_bij = merge(out[0], out[1])
         out = F.relu(self.bn1(out_bij))
         out = F.avg_pool2d(out, self.ds)
         out = out.view(out.size(0), -1)
@@ -149,6 +248,51 @@ class iRevNet(nn.Module):
             x = out
         return x
 
+
+# Batchnorm folding for serving. model/src/distill/models/iRevNet.py and
+# clipper_deploy.py (pickled into the container) have copies of
+# fuse_conv_bn and fold_bn, keep all three in sync.
+def fuse_conv_bn(conv, bn):
+    """ convolution followed by eval-mode batchnorm as one convolution """
+    fused = nn.Conv2d(conv.in_channels, conv.out_channels, conv.kernel_size,
+                      stride=conv.stride, padding=conv.padding,
+                      dilation=conv.dilation, groups=conv.groups, bias=True)
+    scale = torch.rsqrt(bn.running_var + bn.eps)
+    if bn.affine:
+        scale = scale * bn.weight
+    shift = -bn.running_mean * scale
+    if bn.affine:
+        shift = shift + bn.bias
+    if conv.bias is not None:
+        shift = shift + conv.bias * scale
+    with torch.no_grad():
+        fused.weight.copy_(conv.weight * scale.reshape(-1, 1, 1, 1))
+        fused.bias.copy_(shift)
+    return fused.to(conv.weight.device)
+
+
+def fold_bn(model):
+    """ inference-only copy of an iRevNet (or a DataParallel of one) with the
+    batchnorms that follow a convolution in the bottleneck blocks folded into
+    it and dropout removed, forward and inverse are unchanged """
+    model = copy.deepcopy(model).eval()
+    net = model.module if isinstance(model, nn.DataParallel) else model
+    for block in net.stack:
+        layers = []
+        for layer in block.bottleneck_block:
+            if isinstance(layer, nn.Dropout):
+                continue
+            if isinstance(layer, nn.BatchNorm2d) and layers and \
+                    isinstance(layers[-1], nn.Conv2d):
+                layers[-1] = fuse_conv_bn(layers[-1], layer)
+            else:
+                layers.append(layer)
+        block.bottleneck_block = nn.Sequential(*layers)
+    for p in model.parameters():
+        p.requires_grad_(False)
+    return model
+
+
 def iRevNet18(**kwargs):
     return iRevNet(
         nBlocks=[18, 18, 18], nStrides=[1, 2, 2], nChannels=[16, 64, 256],
@@ -6,14 +6,16 @@ ICLR 2018
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 from torch.nn import Parameter
 
 
 def split(x):
+    # channel views, convolutions take them as they are
     n = int(x.size()[1]/2)
-    x1 = x[:, :n, :, :].contiguous()
-    x2 = x[:, n:, :, :].contiguous()
+    x1 = x[:, :n, :, :]
+    x2 = x[:, n:, :, :]
     return x1, x2
 
 
@@ -25,12 +27,10 @@ class injective_pad(nn.Module):
     def __init__(self, pad_size):
         super(injective_pad, self).__init__()
         self.pad_size = pad_size
-        self.pad = nn.ZeroPad2d((0, 0, 0, pad_size))
 
     def forward(self, x):
-        x = x.permute(0, 2, 1, 3)
-        x = self.pad(x)
-        return x.permute(0, 2, 1, 3)
+        # zeros appended along the channels in a single copy
+        return F.pad(x, (0, 0, 0, 0, 0, self.pad_size))
 
     def inverse(self, x):
         return x[:, :x.size(1) - self.pad_size, :, :]
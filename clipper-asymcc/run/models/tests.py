@@ -1,9 +1,11 @@
+import copy
 import unittest
 
 import torch
 from torch import nn
 
-from .model_utils import psi
+from .model_utils import psi, split, merge, injective_pad
+from .iRevNet import iRevNet1, fold_bn
 
 
 class psi_legacy(nn.Module):  # Original implementation of class model_utils.psi
@@ -38,6 +40,25 @@ class psi_legacy(nn.Module):  # Original implementation of class model_utils.psi
         return output.contiguous()
 
 
+def split_legacy(x):  # Original implementation of model_utils.split
+    n = int(x.size()[1]/2)
+    x1 = x[:, :n, :, :].contiguous()
+    x2 = x[:, n:, :, :].contiguous()
+    return x1, x2
+
+
+class injective_pad_legacy(nn.Module):  # Original implementation of class model_utils.injective_pad
+    def __init__(self, pad_size):
+        super(injective_pad_legacy, self).__init__()
+        self.pad_size = pad_size
+        self.pad = nn.ZeroPad2d((0, 0, 0, pad_size))
+
+    def forward(self, x):
+        x = x.permute(0, 2, 1, 3)
+        x = self.pad(x)
+        return x.permute(0, 2, 1, 3)
+
+
 class TPsi(unittest.TestCase):
     def test_forward(self):
         block_size = 3
@@ -54,3 +75,115 @@ class TPsi(unittest.TestCase):
         psi_old_result = psi_legacy(block_size).inverse(t.clone())
         self.assertTrue((psi_new_result == psi_old_result).all().item())
         self.assertTrue(psi_new_result.is_contiguous())
+
+
+class TSplitPad(unittest.TestCase):
+    def test_split(self):
+        t = torch.randn(8, 32, 16, 16, dtype=torch.float32)
+        x1, x2 = split(t)
+        y1, y2 = split_legacy(t)
+        self.assertTrue((x1 == y1).all().item())
+        self.assertTrue((x2 == y2).all().item())
+        # views, no copies
+        self.assertEqual(x1.data_ptr(), t.data_ptr())
+        self.assertTrue((merge(x1, x2) == t).all().item())
+
+    def test_injective_pad(self):
+        t = torch.randn(8, 3, 32, 32, dtype=torch.float32)
+        pad_new_result = injective_pad(29).forward(t)
+        pad_old_result = injective_pad_legacy(29).forward(t)
+        self.assertEqual(pad_new_result.shape, pad_old_result.shape)
+        self.assertTrue((pad_new_result == pad_old_result).all().item())
+        self.assertTrue((injective_pad(29).inverse(pad_new_result) == t).all().item())
+
+    def test_block(self):
+        # the in-place additions of the blocks against y1 = Fx2 + x1
+        torch.manual_seed(0)
+        model = iRevNet1().eval()
+        x = torch.randn(4, 3, 32, 32)
+        with torch.no_grad():
+            out = (x[:, :1], x[:, 1:])
+            for block in model.stack:
+                x1, x2 = out
+                if block.pad != 0 and block.stride == 1:
+                    x1, x2 = split_legacy(injective_pad_legacy(block.pad).forward(merge(x1, x2)))
+                Fx2 = block.bottleneck_block(x2)
+                if block.stride == 2:
+                    x1 = block.psi.forward(x1)
+                    x2 = block.psi.forward(x2)
+                expected = (x2, Fx2 + x1)
+                out = block.forward(out)
+                self.assertTrue((out[0] == expected[0]).all().item())
+                self.assertTrue((out[1] == expected[1]).all().item())
+
+                x2, y1 = out
+                if block.stride == 2:
+                    x2 = block.psi.inverse(x2)
+                x1 = - block.bottleneck_block(x2) + y1
+                if block.stride == 2:
+                    x1 = block.psi.inverse(x1)
+                if block.pad != 0 and block.stride == 1:
+                    x1, x2 = split_legacy(block.inj_pad.inverse(merge(x1, x2)))
+                inverse = block.inverse(out)
+                self.assertTrue((inverse[0] == x1).all().item())
+                self.assertTrue((inverse[1] == x2).all().item())
+
+
+class TFoldBN(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = iRevNet1()
+        # trained-looking statistics, the defaults would make folding trivial
+        for m in self.model.modules():
+            if isinstance(m, nn.BatchNorm2d):
+                m.running_mean.uniform_(-1, 1)
+                m.running_var.uniform_(0.5, 2)
+                m.weight.data.uniform_(0.5, 1.5)
+                m.bias.data.uniform_(-0.5, 0.5)
+        self.model.eval()
+        self.folded = fold_bn(self.model)
+
+    def test_forward(self):
+        x = torch.randn(4, 3, 32, 32)
+        with torch.no_grad():
+            out, out_bij = self.model(x)
+            out_folded, out_bij_folded = self.folded(x)
+        self.assertTrue(torch.allclose(out, out_folded, atol=1e-4))
+        self.assertTrue(torch.allclose(out_bij, out_bij_folded, atol=1e-4))
+
+    def test_inverse(self):
+        y = torch.randn(4, 512, 8, 8)
+        with torch.no_grad():
+            x = self.model.inverse(y)
+            x_folded = self.folded.inverse(y)
+        self.assertTrue(torch.allclose(x, x_folded, atol=1e-4))
+
+    def test_no_batchnorm_in_blocks(self):
+        for block in self.folded.stack:
+            convs = [m for m in block.bottleneck_block if isinstance(m, nn.Conv2d)]
+            bns = [m for m in block.bottleneck_block if isinstance(m, nn.BatchNorm2d)]
+            self.assertEqual(len(convs), 3)
+            self.assertEqual(len(bns), 0 if block.first else 1)
+
+
+class TLowMemory(unittest.TestCase):
+    def test_gradients(self):
+        # recomputing the activations from the block outputs gives the same
+        # gradients, dropout masks and running statistics as keeping them
+        torch.manual_seed(0)
+        model = iRevNet1().train()
+        frugal = copy.deepcopy(model)
+        frugal.low_memory = True
+        x = torch.randn(4, 3, 32, 32, requires_grad=True)
+        x_frugal = x.detach().clone().requires_grad_()
+
+        for m, inp in ((model, x), (frugal, x_frugal)):
+            torch.manual_seed(1)
+            out, out_bij = m(inp)
+            (out.square().sum() + out_bij.mean()).backward()
+
+        self.assertTrue(torch.allclose(x.grad, x_frugal.grad, atol=1e-4))
+        for (name, p), p_frugal in zip(model.named_parameters(), frugal.parameters()):
+            self.assertTrue(torch.allclose(p.grad, p_frugal.grad, rtol=1e-3, atol=1e-4), name)
+        for b, b_frugal in zip(model.buffers(), frugal.buffers()):
+            self.assertTrue(torch.allclose(b.float(), b_frugal.float()))
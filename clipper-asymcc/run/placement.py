@@ -0,0 +1,125 @@
+import random
+import threading
+import time
+
+# Placement policies: which Clipper node (index into worker_ips) a query is
+# sent to.
+#
+#   pinned  every query of a worker thread goes to the node with the thread's
+#           id, random when there is none (the original behaviour); with
+#           anti-affinity the other members go to the following nodes
+#   random  uniformly random node
+#   p2c     power of two choices: the less loaded of two random nodes, by
+#           queries in flight
+#   ewma    random node weighted by the inverse of its EWMA reply latency
+#
+# With placement_anti_affinity the members of one group (k data queries and
+# the parity) are put on distinct nodes, as long as there are enough nodes,
+# so that one slow node cannot hold more members than the parity covers.
+
+
+class Placement:
+    def __init__(self, conf) -> None:
+        self.ips = conf.cfg['worker_ips']
+        self.anti_affinity = conf.cfg['placement_anti_affinity']
+        self.alpha = conf.cfg['placement_ewma_alpha']
+        self.inflight = [0] * len(self.ips)
+        self.latency = [None] * len(self.ips)  # EWMA of reply latency, ms
+        self.lock = threading.Lock()
+
+    def pick(self, candidates):
+        raise NotImplementedError
+
+    def choose(self, clipperid=-1, exclude=()):
+        candidates = [i for i in range(len(self.ips)) if i not in exclude]
+        if not candidates:
+            candidates = list(range(len(self.ips)))
+        with self.lock:
+            return self.pick(candidates)
+
+    def place_group(self, n, clipperid=-1):
+        # Nodes for the n members of one group
+        if not self.anti_affinity:
+            return [self.choose(clipperid) for _ in range(n)]
+        nodes = []
+        for _ in range(n):
+            # once every node holds a member, start spreading again
+            used = nodes[len(nodes) - len(nodes) % len(self.ips):]
+            nodes.append(self.choose(clipperid, exclude=used))
+        return nodes
+
+    def begin(self, node):
+        with self.lock:
+            self.inflight[node] += 1
+        return time.time()
+
+    def end(self, node, start, ok=True):
+        t = float(time.time() - start) * 1000.0
+        with self.lock:
+            self.inflight[node] -= 1
+            if not ok:
+                return
+            if self.latency[node] is None:
+                self.latency[node] = t
+            else:
+                self.latency[node] += self.alpha * (t - self.latency[node])
+
+
+class PinnedPlacement(Placement):
+    def choose(self, clipperid=-1, exclude=()):
+        if clipperid >= 0:
+            # the thread's own node, or the next one not excluded
+            n = len(self.ips)
+            for node in [(clipperid + j) % n for j in range(n)]:
+                if node not in exclude:
+                    return node
+            return clipperid % n
+        return super().choose(clipperid, exclude)
+
+    def pick(self, candidates):
+        return random.choice(candidates)
+
+
+class RandomPlacement(Placement):
+    def pick(self, candidates):
+        return random.choice(candidates)
+
+
+class PowerOfTwoPlacement(Placement):
+    def pick(self, candidates):
+        if len(candidates) == 1:
+            return candidates[0]
+        a, b = random.sample(candidates, 2)
+        return a if self.inflight[a] <= self.inflight[b] else b
+
+
+class EwmaPlacement(Placement):
+    def pick(self, candidates):
+        known = [self.latency[i] for i in candidates if self.latency[i] is not None]
+        if not known:
+            return random.choice(candidates)
+        # nodes not measured yet are treated like the fastest known one
+        fastest = min(known)
+        weights = [1.0 / max(fastest if self.latency[i] is None else self.latency[i], 1e-3)
+                   for i in candidates]
+        return random.choices(candidates, weights=weights)[0]
+
+
+POLICIES = {
+    'pinned': PinnedPlacement,
+    'random': RandomPlacement,
+    'p2c': PowerOfTwoPlacement,
+    'ewma': EwmaPlacement,
+}
+
+_placement = None
+_placement_lock = threading.Lock()
+
+def getPlacement(conf):
+    # The placement is shared by all workers, so that in-flight counts and
+    # latencies cover every query sent
+    global _placement
+    with _placement_lock:
+        if _placement is None:
+            _placement = POLICIES[conf.cfg['placement']](conf)
+    return _placement
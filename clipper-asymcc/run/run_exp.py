@@ -19,24 +19,20 @@ import base64
 import pickle
 from util import in_dim, decode_in_dim
 import global_var
-from worker import Worker, Repairer, Task, TASK_ENCODE_TYPE
+from worker import Worker, Repairer, RepairPool, GroupFormer, requestPoolSize
 from info import ImageInfo, TimeSeries, INFO
 
 RESP_TIME_OUT = 3
 
 
-def SendTask(path_list, k, queryGroupRate):
-    timeSeq = TimeSeries(queryGroupRate)
-    for i in range(global_var.resp_len // k):
-        id_list = []
-        encode_group = []
-        for j,fpath in enumerate(path_list[i*k : i*k + k]):
-            img = ImageInfo(i*k + j, fpath)
-            id_list.append(img.id)
-            encode_group.append(img.byte)
-        time.sleep(timeSeq(i % queryGroupRate))
-        encode_task = Task(TASK_ENCODE_TYPE,(id_list,encode_group))
-        global_var.task_queue.put(encode_task)
+def SendTask(path_list, former, queryRate):
+    # Stream single queries into the group former, queryRate per second
+    timeSeq = TimeSeries(queryRate)
+    for i in range(global_var.resp_len):
+        img = ImageInfo(i, path_list[i])
+        time.sleep(timeSeq(i % queryRate))
+        former.put(img.id, img.byte)
+    former.flush()
 
 
 def WriteResp(outpath):
@@ -61,14 +57,24 @@ def StartWorker(conf, coder):
         print("=========Worker start==========")
         workerThrds[i].start()
         
+    if conf.cfg['repair_procs'] > 0:
+        print("=========RepairPool start==========")
+        repair_pool = RepairPool(conf)
+        global_var.decode_queue = repair_pool.decode_queue
+        return repair_pool
+    
     repairer = Repairer(conf, coder)
     repairThrd = Thread(target=repairer.decode_task)
     print("=========Repairer start==========")
     repairThrd.start()
+    return None
 
 
-def StopWorker():
+def StopWorker(repair_pool=None):
     global_var.FLAG_STOP_THREAD = True
+    if repair_pool is not None:
+        repair_pool.stop()
+        repair_pool.thrd.join()
 
 
 if __name__ == "__main__":
@@ -80,18 +86,23 @@ if __name__ == "__main__":
     path_list = [os.path.join(args.path, file) for file in os.listdir(args.path)]
     conf = Config(args.conf)
     coder = Coder(conf)
-    global_var.queue_init(conf.cfg["input_num"]//conf.cfg['ec_k']*conf.cfg['ec_k'])
+    global_var.queue_init(min(conf.cfg["input_num"], len(path_list)), requestPoolSize(conf))
     
     start = time.time()
-    StartWorker(conf, coder)
-            
-    SendTask(path_list, conf.cfg['ec_k'], conf.cfg['query_rate'])
-    
-    while(True):
-        if global_var.task_finished():
-            StopWorker()
-            break
-        time.sleep(RESP_TIME_OUT)
+    if conf.cfg['engine'] == 'async':
+        from async_engine import AsyncEngine
+        AsyncEngine(conf, coder).run(path_list)
+    else:
+        repair_pool = StartWorker(conf, coder)
+        former = GroupFormer(conf)
+                
+        SendTask(path_list, former, conf.cfg['query_rate'] * conf.cfg['ec_k'])
+        
+        while(True):
+            if global_var.task_finished():
+                StopWorker(repair_pool)
+                break
+            time.sleep(RESP_TIME_OUT)
     
     WriteResp(conf.cfg['output_path'])
     
@@ -35,5 +35,5 @@ conda activate py36
 # install torch torchvision clipper_admin grpcio
 pip3 install pillow==6.0.0 -i https://pypi.tuna.tsinghua.edu.cn/simple
 pip3 install torch==1.0.1 torchvision==0.2.2 numpy==1.16.4 pandas==0.24.2
-pip3 install grpcio grpcio-tools protobuf -i https://pypi.tuna.tsinghua.edu.cn/simple
+pip3 install grpcio grpcio-tools protobuf aiohttp -i https://pypi.tuna.tsinghua.edu.cn/simple
 pip3 install ipython ipykernel
\ No newline at end of file
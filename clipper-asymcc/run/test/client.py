@@ -52,16 +52,34 @@ class Client:
         total_time = float(end_t - start_t)*1000.0
 
         print("Inference task costs: {} ms".format(total_time))
+
+    def stream_infer(self, fpath_list, deadline_ms=0):
+        # one bidirectional stream, results arrive as soon as they are ready
+        start_t = time.time()
+        requests = (infer_pb2.InferRequest(id=i, input=Image(i, fpath).byte, deadline_ms=deadline_ms)
+                    for i, fpath in enumerate(fpath_list))
+        with grpc.insecure_channel("localhost:50052") as channel:
+            stub = infer_pb2_grpc.GrpcServiceStub(channel=channel)
+            for result in stub.stream(requests):
+                if result.expired:
+                    print("Request {} expired after {} ms".format(result.id, float(time.time() - start_t)*1000.0))
+                else:
+                    print("Get inference result: {} {} after {} ms".format(result.id, result.label, float(time.time() - start_t)*1000.0))
         
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='i-NeDD client arguments')
     parser.add_argument("--path", type=str, default="./datatest", help="Path of the input file")
     parser.add_argument("--conf", type=str, default="./config/simple.json", help="Path of the config file")
     parser.add_argument("--port", type=int, default=50053, help="Listening port to recv")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming rpc")
+    parser.add_argument("--deadline", type=int, default=0, help="Per-request deadline (ms) of the streaming rpc")
     
     args = parser.parse_args()
     conf = Config(args.conf)
     
     client = Client(conf,args.port)
     path_list = [os.path.join(args.path, file) for file in os.listdir(args.path)]
-    client.infer(path_list[:2])
\ No newline at end of file
+    if args.stream:
+        client.stream_infer(path_list[:2], args.deadline)
+    else:
+        client.infer(path_list[:2])
\ No newline at end of file
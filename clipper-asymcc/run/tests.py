@@ -0,0 +1,332 @@
+import base64
+import importlib.util
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from queue import Queue
+from unittest import mock
+
+import requests
+import torch
+from torch import nn
+
+import global_var
+import linear_code
+from agent import Router
+import placement
+import worker
+from config import Config
+from decoder import DecodeEngine
+import wire
+from wire import encode_tensors
+
+
+def makeConfig(**cfg):
+    base = {
+        "ec_k": 2,
+        "worker_ips": ["127.0.0.1"],
+        "workerThrd_num": 1,
+        "encoder": "linear",
+        "decoder": "linear",
+        "dataset": "cifar10",
+        "fail_rate": 0.0,
+    }
+    base.update(cfg)
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(base, f)
+    try:
+        return Config(f.name)
+    finally:
+        os.remove(f.name)
+
+
+class FakeReply:
+    def __init__(self) -> None:
+        self.ok = True
+
+    def json(self):
+        return {"output": base64.b64encode(encode_tensors([torch.zeros(10)], [torch.float32])).decode()}
+
+
+class TStragglers(unittest.TestCase):
+    # Queries whose payload ends in b'hang' never reply, as if their node died
+    def setUp(self):
+        self.conf = makeConfig(dispatch='parallel', straggler_mode='deadline', deadline_init_ms=20,
+                               max_inflight=2, request_timeout_ms=200)
+        placement._placement = None
+        global_var.queue_init(0, worker.requestPoolSize(self.conf))
+        self.released = threading.Event()
+
+    def tearDown(self):
+        self.released.set()
+        global_var.clipper_req_pool.shutdown(wait=True)
+        placement._placement = None
+
+    def clipperRequest(self, addr, data, timeout=None):
+        if data.endswith(b'hang'):
+            if not self.released.wait(timeout):
+                raise requests.exceptions.ReadTimeout()
+        return FakeReply()
+
+    def test_hung_stragglers_are_repaired(self):
+        # far more hung queries than the pool has threads
+        groups = 4 * worker.requestPoolSize(self.conf)
+        with mock.patch.object(worker, 'clipperRequest', self.clipperRequest):
+            for g in range(0, groups, self.conf.cfg['max_inflight']):
+                thrds = [threading.Thread(target=worker.inferTaskParallel,
+                                          args=(([2 * i, 2 * i + 1, -1], [b'hang', b'ok', b'ok'], 0.0),
+                                                self.conf, 0))
+                         for i in range(g, g + self.conf.cfg['max_inflight'])]
+                for thrd in thrds:
+                    thrd.start()
+                for thrd in thrds:
+                    thrd.join(timeout=10)
+                    self.assertFalse(thrd.is_alive(), "group stalled behind hung queries")
+
+        answered = sorted(global_var.resp_queue_get()[0] for _ in range(global_var.resp_queue_qsize()))
+        repaired = sorted(global_var.decode_queue_get()[0] for _ in range(global_var.decode_queue_qsize()))
+        self.assertEqual(answered, list(range(1, 2 * groups, 2)))
+        self.assertEqual(repaired, list(range(0, 2 * groups, 2)))
+
+    def test_unrepairable_group_is_dropped(self):
+        # both data members hang past the group timeout, more than r are missing
+        self.conf.cfg['request_timeout_ms'] = 60000
+        self.conf.cfg['group_timeout_ms'] = 300
+        start = time.time()
+        with mock.patch.object(worker, 'clipperRequest', self.clipperRequest):
+            worker.inferTaskParallel(([0, 1, -1], [b'hang', b'hang', b'ok'], 0.0), self.conf, 0)
+        self.assertLess(time.time() - start, 5)
+        answered = sorted(global_var.resp_queue_get() for _ in range(global_var.resp_queue_qsize()))
+        self.assertEqual(answered, [(0, -1), (1, -1)])
+        self.assertTrue(global_var.decode_queue_empty())
+
+    def test_repair_needs_k_members(self):
+        out_list = [None, None, torch.zeros(10)]
+        with self.assertRaises(AssertionError):
+            worker.repairInput(out_list, [None] * 3, [0, 1], 2)
+
+
+class TPlacement(unittest.TestCase):
+    def test_pinned_anti_affinity(self):
+        ips = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+        pinned = placement.PinnedPlacement(makeConfig(worker_ips=ips, placement_anti_affinity=True))
+        self.assertEqual(pinned.place_group(3, 1), [1, 2, 0])
+        # once every node holds a member, spreading starts over
+        self.assertEqual(pinned.place_group(5, 2), [2, 0, 1, 2, 0])
+
+    def test_pinned(self):
+        ips = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+        pinned = placement.PinnedPlacement(makeConfig(worker_ips=ips))
+        self.assertEqual(pinned.place_group(3, 1), [1, 1, 1])
+
+    def test_members_on_distinct_nodes(self):
+        ips = ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4"]
+        for policy in placement.POLICIES.values():
+            nodes = policy(makeConfig(worker_ips=ips, placement_anti_affinity=True)).place_group(3, 0)
+            self.assertEqual(len(set(nodes)), 3, policy.__name__)
+
+
+def decoderModel():
+    torch.manual_seed(0)
+    model = nn.Sequential(nn.Linear(30, 64), nn.BatchNorm1d(64), nn.ReLU(), nn.Dropout(0.5), nn.Linear(64, 20))
+    # non-trivial running statistics, which warmup must not touch
+    model.train()
+    with torch.no_grad():
+        model(torch.randn(256, 30))
+    return model.eval()
+
+
+class TDecodeEngine(unittest.TestCase):
+    def setUp(self):
+        self.x = torch.randn(40, 30)
+        self.model = decoderModel()
+        with torch.no_grad():
+            self.expected = self.model(self.x)
+
+    def engine(self, **kwargs):
+        return DecodeEngine(decoderModel().train(), **kwargs)
+
+    def test_cpu_fallback(self):
+        with mock.patch.object(torch.cuda, 'is_available', return_value=False):
+            engine = self.engine(device='cuda')
+        self.assertEqual(engine.device.type, 'cpu')
+        self.assertTrue(torch.allclose(engine.run(self.x), self.expected, atol=1e-6))
+
+    def test_warmup(self):
+        engine = self.engine(device='cpu', example=self.x[:1], warmup=5)
+        self.assertTrue(torch.allclose(engine.run(self.x), self.expected, atol=1e-6))
+        for a, b in zip(engine.model.state_dict().values(), self.model.state_dict().values()):
+            self.assertTrue(torch.equal(a, b))
+
+    def test_trace(self):
+        engine = self.engine(device='cpu', jit='trace', example=self.x[:1])
+        self.assertIsInstance(engine.model, torch.jit.ScriptModule)
+        self.assertTrue(torch.allclose(engine.run(self.x), self.expected, atol=1e-5))
+
+    def test_script(self):
+        engine = self.engine(device='cpu', jit='script', example=self.x[:1])
+        self.assertIsInstance(engine.model, torch.jit.ScriptModule)
+        self.assertTrue(torch.allclose(engine.run(self.x), self.expected, atol=1e-5))
+
+    def test_tuple_output(self):
+        class WithFeatures(nn.Module):
+            def __init__(self, model):
+                super(WithFeatures, self).__init__()
+                self.model = model
+
+            def forward(self, x):
+                return self.model(x), x
+
+        engine = DecodeEngine(WithFeatures(decoderModel()), device='cpu')
+        self.assertTrue(torch.allclose(engine.run(self.x), self.expected, atol=1e-6))
+
+    @unittest.skipUnless(torch.cuda.is_available(), "needs CUDA")
+    def test_pinned_ring(self):
+        engine = self.engine(device='cuda', chunk=8, ring=2)
+        for _ in range(3):
+            self.assertTrue(torch.allclose(engine.run(self.x), self.expected, atol=1e-5))
+        ptrs = [buf.data_ptr() for buf in engine.ring]
+        engine.run(self.x)
+        # the same pinned buffers are reused
+        self.assertEqual([buf.data_ptr() for buf in engine.ring], ptrs)
+        self.assertTrue(all(buf.is_pinned() for buf in engine.ring))
+
+
+class TLinearCode(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.k, self.r = 4, 3
+        self.weights = linear_code.parity_weights(self.k, self.r)
+        self.x = torch.randn(5, self.k, 10)
+        self.out = torch.cat([self.x, linear_code.encode(self.x, self.weights)], dim=1)
+
+    def test_parity_weights(self):
+        self.assertTrue(torch.allclose(self.weights.sum(dim=1), torch.ones(self.r)))
+        self.assertTrue(torch.allclose(self.out[:, self.k], self.x.mean(dim=1), atol=1e-6))
+        self.assertTrue(torch.allclose(self.out[:, self.k], linear_code.encode(self.x), atol=1e-6))
+
+    def test_solve(self):
+        # any r or fewer of the k+r members missing
+        n = self.k + self.r
+        for m in range(self.r + 1):
+            for lost in itertools.combinations(range(n), m):
+                missing = torch.zeros(len(self.x), n, dtype=torch.bool)
+                missing[:, list(lost)] = True
+                out = self.out.masked_fill(missing.unsqueeze(-1), 0)
+                x = linear_code.solve(out, missing, self.weights)
+                self.assertTrue(torch.allclose(x, self.x, atol=1e-4), lost)
+
+    def test_underdetermined(self):
+        missing = torch.zeros(len(self.x), self.k + self.r, dtype=torch.bool)
+        missing[0, :self.r + 1] = True
+        with self.assertRaises(ValueError):
+            linear_code.solve(self.out, missing, self.weights)
+
+    def test_training_copy(self):
+        # model/src/distill/models/linear_code.py must stay in sync
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '../../model/src/distill/models/linear_code.py')
+        if not os.path.isfile(path):
+            self.skipTest("no distill tree")
+        spec = importlib.util.spec_from_file_location('distill_linear_code', path)
+        copy = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(copy)
+        for k, r in [(2, 1), (4, 3), (6, 2)]:
+            w = linear_code.parity_weights(k, r)
+            x = torch.randn(5, k, 10)
+            self.assertTrue(torch.equal(copy.parity_weights(k, r), w))
+            self.assertTrue(torch.equal(copy.encode(x, w), linear_code.encode(x, w)))
+        self.assertTrue(torch.equal(copy.encode(self.x), linear_code.encode(self.x)))
+
+
+class TWire(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tensors = [torch.randn(10), torch.randn(8, 64, 64), torch.randn(3, 1, 5)]
+
+    def roundtrip(self, dtype):
+        buf = wire.encode_tensors(self.tensors, [dtype] * len(self.tensors))
+        return wire.decode_tensors(buf)
+
+    def test_float32(self):
+        for t, d in zip(self.tensors, self.roundtrip(torch.float32)):
+            self.assertTrue(torch.equal(t, d))
+
+    def test_float16(self):
+        for t, d in zip(self.tensors, self.roundtrip(torch.float16)):
+            self.assertEqual(d.dtype, torch.float16)
+            self.assertTrue(torch.equal(t.half(), d))
+
+    def test_int8(self):
+        for t, d in zip(self.tensors, self.roundtrip(torch.int8)):
+            # quantised to 255 levels over [-max, max]
+            scale = t.abs().max() / 127.0
+            self.assertEqual(d.shape, t.shape)
+            self.assertLessEqual((t - d).abs().max().item(), scale.item() / 2 + 1e-6)
+
+    def test_mixed_and_aligned(self):
+        buf = wire.encode_tensors(self.tensors, [torch.float16, torch.int8, torch.float32])
+        decoded = wire.decode_output(base64.b64encode(buf).decode())
+        self.assertEqual([d.shape for d in decoded], [t.shape for t in self.tensors])
+        self.assertTrue(torch.equal(decoded[2], self.tensors[2]))
+
+    def test_bad_magic(self):
+        buf = bytearray(wire.encode_tensors(self.tensors[:1], [torch.float32]))
+        buf[:3] = b'XXX'
+        with self.assertRaisesRegex(ValueError, "Not a wire-format"):
+            wire.decode_tensors(bytes(buf))
+
+    def test_bad_version(self):
+        buf = bytearray(wire.encode_tensors(self.tensors[:1], [torch.float32]))
+        buf[3] = wire.WIRE_VERSION + 1
+        with self.assertRaisesRegex(ValueError, "version"):
+            wire.decode_tensors(bytes(buf))
+
+    def test_unknown_dtype(self):
+        buf = bytearray(wire.encode_tensors(self.tensors[:1], [torch.float32]))
+        buf[5] = 99
+        with self.assertRaisesRegex(ValueError, "dtype"):
+            wire.decode_tensors(bytes(buf))
+
+    def test_truncated(self):
+        buf = wire.encode_tensors(self.tensors, [torch.float16, torch.int8, torch.float32])
+        for end in list(range(len(buf) // 2)) + [len(buf) - 1]:
+            with self.assertRaisesRegex(ValueError, "Truncated|Not a wire-format"):
+                wire.decode_tensors(buf[:end])
+
+    def test_query_header(self):
+        query = wire.encode_query(b'payload', True, 'int8')
+        magic, version, flags, code = wire._QUERY_HEADER.unpack_from(query, 0)
+        self.assertEqual((magic, version), (wire.QUERY_MAGIC, wire.QUERY_VERSION))
+        self.assertEqual(flags, wire.QUERY_RETURN_BIJ)
+        self.assertEqual(wire.WIRE_DTYPES[code], torch.int8)
+        self.assertEqual(query[wire._QUERY_HEADER.size:], b'payload')
+        flags = wire._QUERY_HEADER.unpack_from(wire.encode_query(b'', False), 0)[2]
+        self.assertEqual(flags, 0)
+
+
+class TRouter(unittest.TestCase):
+    def test_duplicate_and_unknown_results(self):
+        global_var.queue_init(0)
+        router = Router()
+        sink = Queue()
+        first = router.register(sink, 7)
+        second = router.register(sink, 8)
+        # a late repair of the first query, and a result nobody asked for
+        for result in [(first, 1), (first, 2), (12345, 3), (second, 4)]:
+            global_var.resp_queue_put(result)
+        global_var.FLAG_STOP_THREAD = True
+        try:
+            router.route_task()
+        finally:
+            global_var.FLAG_STOP_THREAD = False
+        routed = [sink.get() for _ in range(sink.qsize())]
+        self.assertEqual(routed, [('result', first, 7, 1), ('result', second, 8, 4)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
 import torch
 
+# inference_mode where the installed torch has it
+inference_mode = getattr(torch, 'inference_mode', torch.no_grad)
+
 in_dim = {
     "cifar10": [3, 32, 32],
     "cifar100": [3, 32, 32],
@@ -0,0 +1,134 @@
+import base64
+import struct
+import warnings
+import numpy as np
+import torch
+
+# Binary encodings exchanged with the deployed model.
+#
+# Responses: a header (magic, version, tensor count) followed by, for each
+# tensor, its dtype code, rank and shape (plus a float32 scale for quantised
+# int8) and then its raw little-endian data, padded so that every data block
+# starts 8-byte aligned.
+#
+# Queries: a header (magic, version, flags, requested out_bij dtype code)
+# followed by the input payload. Plain payloads without the header are still
+# accepted by the container and answered with logits and out_bij.
+#
+# The container side (clipper_deploy.py) has its own copy of this protocol,
+# keep both in sync.
+
+WIRE_MAGIC = b'ACW'
+WIRE_VERSION = 1
+
+WIRE_DTYPES = {
+    0: torch.float32,
+    1: torch.float16,
+    2: torch.int8,  # quantised, dequantised with a per-tensor scale
+}
+WIRE_CODES = {dtype: code for code, dtype in WIRE_DTYPES.items()}
+WIRE_NUMPY = {
+    torch.float32: np.float32,
+    torch.float16: np.float16,
+    torch.int8: np.int8,
+}
+WIRE_NAMES = {
+    'float32': torch.float32,
+    'float16': torch.float16,
+    'int8': torch.int8,
+}
+
+QUERY_MAGIC = b'ACQ'
+QUERY_VERSION = 1
+QUERY_RETURN_BIJ = 1
+
+_HEADER = struct.Struct("<3sBB")
+_TENSOR_HEADER = struct.Struct("<BB")
+_SCALE = struct.Struct("<f")
+_QUERY_HEADER = struct.Struct("<3sBBB")
+
+
+def quantize(t):
+    scale = t.abs().max().item() / 127.0
+    if scale == 0:
+        scale = 1.0
+    return torch.round(t / scale).clamp(-127, 127).to(torch.int8), scale
+
+
+def encode_tensors(tensors, dtypes):
+    parts = [_HEADER.pack(WIRE_MAGIC, WIRE_VERSION, len(tensors))]
+    offset = _HEADER.size
+    for t, dtype in zip(tensors, dtypes):
+        t = t.detach().cpu()
+        scale = b''
+        if dtype == torch.int8:
+            t, s = quantize(t.float())
+            scale = _SCALE.pack(s)
+        data = t.to(dtype).contiguous().numpy()
+        data = data.astype(data.dtype.newbyteorder('<'), copy=False)
+        header = _TENSOR_HEADER.pack(WIRE_CODES[dtype], data.ndim) + \
+            struct.pack("<%dI" % data.ndim, *data.shape) + scale
+        pad = -(offset + len(header)) % 8
+        parts += [header, b'\0' * pad, data.tobytes()]
+        offset += len(header) + pad + data.nbytes
+    return b''.join(parts)
+
+
+def decode_tensors(buf):
+    # float32 and float16 tensors are read-only views on buf (nothing is
+    # copied), callers must not modify them in place
+    try:
+        return _decode_tensors(buf)
+    except struct.error:
+        raise ValueError("Truncated wire-format tensor message")
+
+
+def _decode_tensors(buf):
+    magic, version, count = _HEADER.unpack_from(buf, 0)
+    if magic != WIRE_MAGIC:
+        raise ValueError("Not a wire-format tensor message")
+    if version != WIRE_VERSION:
+        raise ValueError("Unsupported wire format version: {}".format(version))
+    offset = _HEADER.size
+    tensors = []
+    for _ in range(count):
+        code, ndim = _TENSOR_HEADER.unpack_from(buf, offset)
+        offset += _TENSOR_HEADER.size
+        shape = struct.unpack_from("<%dI" % ndim, buf, offset)
+        offset += 4 * ndim
+        if code not in WIRE_DTYPES:
+            raise ValueError("Unknown wire format dtype code: {}".format(code))
+        dtype = WIRE_DTYPES[code]
+        scale = None
+        if dtype == torch.int8:
+            scale = _SCALE.unpack_from(buf, offset)[0]
+            offset += _SCALE.size
+        offset += -offset % 8
+        numel = int(np.prod(shape))
+        if offset + numel * np.dtype(WIRE_NUMPY[dtype]).itemsize > len(buf):
+            raise ValueError("Truncated wire-format tensor message")
+        with warnings.catch_warnings():
+            # torch warns that buf is not writable, which is expected here
+            warnings.simplefilter("ignore", UserWarning)
+            if hasattr(torch, 'frombuffer'):
+                t = torch.frombuffer(buf, dtype=dtype, count=numel, offset=offset)
+            else:
+                # torch < 1.10 goes through numpy, still without a copy
+                t = torch.from_numpy(np.frombuffer(buf, dtype=WIRE_NUMPY[dtype], count=numel, offset=offset))
+        offset += numel * t.element_size()
+        if scale is not None:
+            t = t.float() * scale
+        tensors.append(t.reshape(shape))
+    return tensors
+
+
+def decode_output(output):
+    # Clipper returns the model output as a JSON string, so it is base64 text
+    return decode_tensors(base64.b64decode(output))
+
+
+def encode_query(payload, return_bij, bij_dtype='float16'):
+    flags = QUERY_RETURN_BIJ if return_bij else 0
+    header = _QUERY_HEADER.pack(QUERY_MAGIC, QUERY_VERSION, flags,
+                                WIRE_CODES[WIRE_NAMES[bij_dtype]])
+    return header + payload
@@ -1,7 +1,7 @@
-from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from queue import Queue
 import queue
-from threading import Thread
+from threading import Thread, BoundedSemaphore
 from coder import Coder
 import requests
 import json
@@ -11,14 +11,16 @@ import socket
 import numpy as np
 import global_var
 import torch
+import torch.multiprocessing as mp
 import torchvision.transforms as transforms
 import io
 from PIL import Image
 import base64
 import re
 from util import in_dim, decode_in_dim
-import pickle
-from info import INFO
+from wire import decode_output, encode_query, encode_tensors
+from info import INFO, LATENCY
+from placement import getPlacement
 
 
 TASK_ENCODE_TYPE = 0
@@ -34,91 +36,346 @@ transformPIL = transforms.Compose([
     transforms.ToPILImage()
 ])
 
-def clipperRequest(addr, data):
+def clipperRequest(addr, data, timeout=None):
     url = "http://{}:1337/pytorch-irevnet-app/predict".format(addr)
     # url = "http://localhost:1337/pytorch-irevnet-app/predict"
     req_json = json.dumps({
         'input': base64.b64encode(data).decode()
     })
     headers = {'Content-type': 'application/json'}
-    return requests.post(url, headers=headers, data=req_json)
+    return requests.post(url, headers=headers, data=req_json, timeout=timeout)
 
-def encodeTask(input, coder):
-    print("=========encodeTask start=========")
+def requestTimeout(conf):
+    # Seconds a pooled query may run: a straggler that never replies would
+    # otherwise hold its pool thread for good
+    return conf.cfg['request_timeout_ms'] / 1000.0
+
+def requestPoolSize(conf):
+    # every in-flight group of every Worker may have all k+r queries running
+    return conf.cfg['workerThrd_num'] * conf.cfg['max_inflight'] * (conf.cfg['ec_k'] + conf.cfg['ec_r'])
+
+def loadImages(encode_list):
     # bytes --> tensor
-    id_list, encode_list = input
     encode_tensor_list = []
     for data in encode_list:
         encode_tensor_list.append(transform(Image.open(io.BytesIO(data))))
-    final_tensor=torch.stack(encode_tensor_list,0)
+    return torch.stack(encode_tensor_list,0)
+
+def parityBytes(encode_tensor, parity_format='tensor'):
+    # tensor --> bytes, losslessly as a float16 tensor unless JPEG is asked for
+    if parity_format == 'tensor':
+        return encode_tensors([encode_tensor], [torch.float16])
+    imgByte = io.BytesIO()
+    transformPIL(encode_tensor).save(imgByte, format = 'JPEG')
+    return imgByte.getvalue()
+
+def encodeGroup(encode_list, coder, parity_format='tensor'):
+    final_tensor = loadImages(encode_list)
     
     # encode
     start = time.time()
-    encode_tensor = coder.encode(final_tensor)
+    encode_tensor = coder.encode(final_tensor)  #[r, 3, 32, 32]
     end = time.time()
     print("encode costs: {} ms".format(float(end-start)*1000.0))
     INFO.add_encodetime(float(end - start) * 1000.0)
     
-    # tensor --> bytes
-    imgByte = io.BytesIO()
-    transformPIL(encode_tensor).save(imgByte, format = 'JPEG')
-    encode_data = imgByte.getvalue()
+    return [parityBytes(parity, parity_format) for parity in encode_tensor], float(end - start) * 1000.0
+
+def encodeTask(input, coder):
+    print("=========encodeTask start=========")
+    id_list, encode_list = input
+    encode_data, encodeTime = encodeGroup(encode_list, coder, coder.conf.cfg['parity_format'])
     
-    id_list.append(-1)
-    encode_list.append(encode_data)
+    id_list += [-1] * len(encode_data)
+    encode_list += encode_data
     
-    infer_task = Task(TASK_INFER_TYPE, (id_list, encode_list, float(end - start) * 1000.0))
+    infer_task = Task(TASK_INFER_TYPE, (id_list, encode_list, encodeTime))
     global_var.task_queue_put(infer_task)
     print("=========encodeTask end=========")
 
+def encodeBatchTask(inputs, coder, out=None):
+    # Encode G pending groups in one forward pass: [G, k, C, H, W] --> [G, r, C, H, W],
+    # into out[:G] if a buffer is given
+    print("=========encodeBatchTask start=========")
+    final_tensor = torch.stack([loadImages(encode_list) for _, encode_list in inputs], 0)
+    if out is not None:
+        out = out[:len(inputs)]
+    
+    start = time.time()
+    encode_tensor = coder.encode_batch(final_tensor, out=out)
+    end = time.time()
+    print("encode {} groups costs: {} ms".format(len(inputs), float(end-start)*1000.0))
+    
+    for (id_list, encode_list), parities in zip(inputs, encode_tensor):
+        INFO.add_encodetime(float(end - start) * 1000.0)
+        id_list += [-1] * len(parities)
+        encode_list += [parityBytes(parity, coder.conf.cfg['parity_format']) for parity in parities]
+        
+        infer_task = Task(TASK_INFER_TYPE, (id_list, encode_list, float(end - start) * 1000.0))
+        global_var.task_queue_put(infer_task)
+    print("=========encodeBatchTask end=========")
+
+def blankImage(data):
+    # An all-black image of the same size and mode as the encoded image data
+    img = Image.open(io.BytesIO(data))
+    imgByte = io.BytesIO()
+    Image.new(img.mode, img.size).save(imgByte, format = 'JPEG')
+    return imgByte.getvalue()
+
+def groupTask(id_list, encode_list, conf):
+    # A partial group (fewer than k queries) is either padded with blank
+    # members (id -1), which are queried but never answered, or sent without
+    # parity ("passthrough"), in which case its queries cannot be repaired
+    missing = conf.cfg['ec_k'] - len(id_list)
+    if missing > 0 and conf.cfg['partial_group'] == 'passthrough':
+        return Task(TASK_INFER_TYPE, (id_list, encode_list, 0.0))
+    if missing > 0:
+        blank = blankImage(encode_list[0])
+        id_list = id_list + [-1] * missing
+        encode_list = encode_list + [blank] * missing
+    return Task(TASK_ENCODE_TYPE, (id_list, encode_list))
+
+def placedRequest(placement, node, data, timeout=None):
+    # clipperRequest to a placed node, tracked by the placement policy
+    start = placement.begin(node)
+    resp = None
+    try:
+        resp = clipperRequest(placement.ips[node], data, timeout)
+        return resp
+    finally:
+        ok = resp is not None and resp.ok
+        placement.end(node, start, ok)
+        if ok:
+            # measured from when the query left the pool queue, queueing
+            # under load must not stretch the straggler deadline
+            LATENCY.add(float(time.time() - start) * 1000.0)
+
+def queryPayload(data, conf, return_bij=None):
+    # out_bij is only returned when the decoder needs it up front
+    if return_bij is None:
+        return_bij = conf.cfg['bij_fetch'] == 'eager'
+    return encode_query(data, return_bij, conf.cfg['bij_dtype'])
+
+def parseResponse(output, conf):
+    tensors = decode_output(output)  #[10], [512, 8, 8]
+    tensor_out = tensors[0].float()
+    if len(tensors) == 1:
+        return tensor_out, None
+    return tensor_out, tensors[1].float().reshape(decode_in_dim[conf.cfg['dataset']]) #[8, 64, 64]
+
+def bijSurvivors(out_list, failed, ec_k):
+    # Members whose out_bij the distilled decoder repairs from: the other k-1
+    # data queries and parity 0. Empty when the repair cannot use it.
+    if len(failed) != 1 or out_list[ec_k] is None:
+        return []
+    return [i for i in range(ec_k) if i != failed[0]] + [ec_k]
+
+def fetchBij(data_list, out_list, outbij_list, failed, conf, clipperid):
+    # Lazily fetch out_bij of the surviving group members for a repair
+    need = [i for i in bijSurvivors(out_list, failed, conf.cfg['ec_k']) if outbij_list[i] is None]
+    placement = getPlacement(conf)
+    nodes = placement.place_group(len(need), clipperid)
+    reqs = {}
+    for i, node in zip(need, nodes):
+        reqs[global_var.clipper_req_pool.submit(placedRequest, placement, node, queryPayload(data_list[i], conf, True),
+                                                requestTimeout(conf))] = i
+    for req in reqs:
+        try:
+            _, outbij_list[reqs[req]] = parseResponse(req.result().json()["output"], conf)
+        except Exception as e:
+            # left as None, the decoder repairs without this out_bij
+            print("bij fetch failed:", reqs[req], repr(e))
+
+def repairInput(out_list, outbij_list, failed, ec_k):
+    # failed data outputs may be missing (straggler) or present (injected failure)
+    known = next(out for out in out_list if out is not None)
+    missing = torch.tensor([out is None or i in failed for i, out in enumerate(out_list)])
+    # any k of the k+r members determine the rest, with fewer the solve is
+    # underdetermined
+    assert(int(missing.sum()) <= len(out_list) - ec_k)
+    
+    out_decode = torch.stack([torch.zeros_like(known) if missing[i] else out
+                              for i, out in enumerate(out_list)], dim=0)  # (k+r) * [10] --> [k+r, 10]
+    survivors = bijSurvivors(out_list, failed, ec_k)
+    outbij_decode = None
+    if survivors and all(outbij_list[i] is not None for i in survivors):
+        outbij_decode = torch.cat([outbij_list[i] for i in survivors], dim=0) # k * [8, 64, 64] --> [8*k, 64, 64]
+    return out_decode, outbij_decode, missing
+
+def repairRequest(id_list, out_list, outbij_list, failed, ec_k):
+    # one repair per failed query, blank padding members are not repaired
+    out_decode, outbij_decode, missing = repairInput(out_list, outbij_list, failed, ec_k)
+    for i in failed:
+        if id_list[i] >= 0:
+            global_var.decode_queue_put((id_list[i], out_decode, outbij_decode, missing, i, time.time()))
+
 def inferTask(input, conf, clipperid):
+    if conf.cfg['dispatch'] == 'parallel':
+        inferTaskParallel(input, conf, clipperid)
+    else:
+        inferTaskSerial(input, conf, clipperid)
+
+def inferTaskSerial(input, conf, clipperid):
     print("=========inferTask start=========")
     id_list, data_list, ecodeTime = input
     out_list = []
     outbij_list = []
+    placement = getPlacement(conf)
+    nodes = placement.place_group(len(data_list), clipperid)
     
-    # req_Thrds = []
     for i, data in enumerate(data_list):
-        chosen = random.randint(0, conf.num_worker-1)
-        if clipperid >=0:
-            chosen = clipperid
-        chosen_ip = conf.cfg['worker_ips'][chosen]
         start = time.time()
-        resp = clipperRequest(chosen_ip, data)
+        resp = placedRequest(placement, nodes[i], queryPayload(data, conf))
         end = time.time()
         print("Inference time: {} ms".format(float(end - start) * 1000.0))
         INFO.add_infertime(float(end - start) * 1000.0 + ecodeTime)
-        # req_Thrds.append(global_var.clipper_req_pool.submit(clipperRequest, chosen_ip, data))
-    
-    # for i, _ in enumerate(data_list):
-        # resp = req_Thrds[i].result()
-        json_output = eval(resp.json()["output"])
-        tensor_out = pickle.loads(json_output[0])  #[1, 10]
-        tensor_outbij = pickle.loads(json_output[1])  #[1, 512, 8, 8]
         
-        out_list.append(tensor_out[0])
-        outbij_list.append(tensor_outbij[0].reshape(decode_in_dim[conf.cfg['dataset']])) #[8, 64, 64]
+        tensor_out, tensor_outbij = parseResponse(resp.json()["output"], conf)
+        out_list.append(tensor_out)
+        outbij_list.append(tensor_outbij)
     
-    failed = -1
-    if random.random() < conf.cfg['fail_rate'] * conf.cfg['ec_k']:
-        failed = random.randint(0, conf.cfg['ec_k'] - 1)  #[0,k-1]
+    # only coded groups (parities last) can be repaired, and only real queries
+    members = [i for i in range(conf.cfg['ec_k']) if id_list[-1] < 0 and id_list[i] >= 0]
+    if conf.cfg['fail_mode'] == 'group':
+        # one query of the group fails with probability fail_rate * k
+        failed = []
+        if random.random() < conf.cfg['fail_rate'] * conf.cfg['ec_k']:
+            failed = [i for i in [random.randint(0, conf.cfg['ec_k'] - 1)] if i in members]  #[0,k-1]
+    else:
+        # every query fails with probability per_query_fail_rate, at most r of them
+        failed = [i for i in members if random.random() < conf.cfg['per_query_fail_rate']]
+        failed = sorted(random.sample(failed, min(len(failed), conf.cfg['ec_r'])))  #[0,k-1]
+    if failed:
         print("failed:",failed)
-        zero_tensor = torch.zeros_like(out_list[failed])
-        out_list[failed] = zero_tensor
-        
-        out_decode = torch.stack(out_list, dim=0)  # (k+1) * [10] --> [k, 10]
-        outbij_decode = torch.cat(outbij_list[:failed] + outbij_list[failed+1:], dim=0) # k * [8, 64, 64] --> [8*k, 64, 64]
-        global_var.decode_queue_put((id_list[failed], out_decode, outbij_decode))
+        if conf.cfg['bij_fetch'] == 'lazy':
+            fetchBij(data_list, out_list, outbij_list, failed, conf, clipperid)
+        repairRequest(id_list, out_list, outbij_list, failed, conf.cfg['ec_k'])
     else:
         print("no fail")
         
-    for i, data in enumerate(out_list[:-1]):
-        if failed < 0 or i != failed:
+    for i, data in enumerate(out_list):
+        if id_list[i] >= 0 and i not in failed:
             global_var.resp_queue_put((id_list[i], data.numpy().argmax()))
             print("resp:",id_list[i])
     
     print("=========inferTask end=========")
 
+def groupDeadline(conf):
+    # Seconds after dispatch at which a missing data reply counts as a straggler
+    deadline = LATENCY.quantile(conf.cfg['deadline_quantile'])
+    if deadline is None:
+        deadline = conf.cfg['deadline_init_ms']
+    return deadline / 1000.0
+
+class CodedGroup:
+    # Bookkeeping for one in-flight group of k data queries and r parities.
+    # In "eager" mode straggling data queries are repaired as soon as any k
+    # replies are in; in "deadline" mode only once the group has outlived
+    # the observed latency quantile. After group_timeout_ms the group is
+    # given up on whatever is missing.
+    def __init__(self, id_list, conf) -> None:
+        self.id_list = id_list
+        self.ec_k = conf.cfg['ec_k']
+        self.mode = conf.cfg['straggler_mode']
+        self.out_list = [None] * len(id_list)
+        self.outbij_list = [None] * len(id_list)
+        self.arrived = 0
+        self.errors = 0
+        self.start = time.time()
+        self.deadline = self.start + groupDeadline(conf)
+        self.expire = self.start + conf.cfg['group_timeout_ms'] / 1000.0
+    
+    def add(self, i, out, outbij):
+        self.out_list[i] = out
+        self.outbij_list[i] = outbij
+        self.arrived += 1
+    
+    def fail(self, i):
+        # A query that errored out never replies, it is repaired like a straggler
+        self.errors += 1
+    
+    def timeout(self):
+        # How long to wait for the next reply
+        limit = self.expire
+        if self.mode == 'deadline' and self.arrived >= self.ec_k:
+            limit = min(limit, self.deadline)
+        return max(limit - time.time(), 0)
+    
+    def straggler(self):
+        # Returns (finished, failed): failed are the data indices to repair
+        missing = [i for i, out in enumerate(self.out_list) if out is None and self.id_list[i] >= 0]
+        if not missing:
+            return True, []
+        if self.arrived + self.errors == len(self.out_list) or time.time() >= self.expire or \
+                (self.arrived >= self.ec_k and (self.mode == 'eager' or time.time() >= self.deadline)):
+            return True, [i for i in range(self.ec_k) if self.out_list[i] is None]
+        return False, []
+    
+    def repairable(self):
+        # any k replies determine the missing members, see repairInput
+        return self.arrived >= self.ec_k
+
+def dropGroup(id_list, failed):
+    # Queries of a group with more than r members missing cannot be repaired,
+    # they are answered with label -1 (like expired stream queries)
+    for i in failed:
+        if id_list[i] >= 0:
+            global_var.resp_queue_put((id_list[i], -1))
+            print("lost:",id_list[i])
+
+def inferTaskParallel(input, conf, clipperid):
+    # Fan out all k+1 queries of the group at once; late replies are ignored
+    print("=========inferTask start=========")
+    id_list, data_list, ecodeTime = input
+    group = CodedGroup(id_list, conf)
+    placement = getPlacement(conf)
+    nodes = placement.place_group(len(data_list), clipperid)
+    
+    req_futures = {}
+    for i, data in enumerate(data_list):
+        req = global_var.clipper_req_pool.submit(placedRequest, placement, nodes[i], queryPayload(data, conf),
+                                                 requestTimeout(conf))
+        req_futures[req] = i
+    
+    finished, failed = False, []
+    pending = set(req_futures)
+    while pending and not finished:
+        done, pending = wait(pending, timeout=group.timeout(), return_when=FIRST_COMPLETED)
+        
+        for req in done:
+            i = req_futures[req]
+            try:
+                reply = parseResponse(req.result().json()["output"], conf)
+            except Exception as e:
+                print("query failed:", i, repr(e))
+                group.fail(i)
+                continue
+            end = time.time()
+            print("Inference time: {} ms".format(float(end - group.start) * 1000.0))
+            INFO.add_infertime(float(end - group.start) * 1000.0 + ecodeTime)
+            
+            group.add(i, *reply)
+            if id_list[i] >= 0:
+                global_var.resp_queue_put((id_list[i], group.out_list[i].numpy().argmax()))
+                print("resp:",id_list[i])
+        
+        finished, failed = group.straggler()
+    
+    for req in pending:
+        req.cancel()
+    
+    if failed and not group.repairable():
+        dropGroup(id_list, failed)
+    elif failed:
+        print("straggler:",failed)
+        if conf.cfg['bij_fetch'] == 'lazy':
+            fetchBij(data_list, group.out_list, group.outbij_list, failed, conf, clipperid)
+        repairRequest(id_list, group.out_list, group.outbij_list, failed, conf.cfg['ec_k'])
+    else:
+        print("no fail")
+    
+    print("=========inferTask end=========")
+
 
 class Task:
     def __init__(self, type, input) -> None:
@@ -126,58 +383,246 @@ class Task:
         self.input = input
 
 
+class EncodeBatcher:
+    # Collects encode tasks for up to encode_batch_window_ms (or until
+    # encode_batch_size groups are pending) and encodes them together
+    def __init__(self, conf, coder) -> None:
+        self.coder = coder
+        self.batch_size = conf.cfg['encode_batch_size']
+        self.window = conf.cfg['encode_batch_window_ms'] / 1000.0
+        # parities are serialised before the next batch, so one buffer will do
+        self.buffer = torch.empty([self.batch_size, conf.cfg['ec_r']] + in_dim[conf.cfg['dataset']])
+        self.queue = Queue()
+        self.thrd = Thread(target=self.batch_task)
+        self.thrd.start()
+
+    def put(self, input):
+        self.queue.put(input)
+
+    def batch_task(self):
+        while(True):
+            try:
+                batch = [self.queue.get(block=True, timeout=TIME_OUT)]
+            except queue.Empty:
+                if global_var.FLAG_STOP_THREAD:
+                    print("EncodeBatcher end")
+                    break
+                else:
+                    continue
+            
+            deadline = time.time() + self.window
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get(block=True, timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+            
+            try:
+                encodeBatchTask(batch, self.coder, self.buffer)
+            except Exception as e:
+                print("task failed:", repr(e))
+
+class GroupFormer:
+    # Forms coded groups from a stream of single queries. A group is sealed
+    # once k queries are in, or group_wait_ms after its first query arrived
+    # (then it is completed by groupTask), whichever comes first.
+    def __init__(self, conf) -> None:
+        self.conf = conf
+        self.ec_k = conf.cfg['ec_k']
+        self.wait = conf.cfg['group_wait_ms'] / 1000.0
+        self.queue = Queue()
+        self.thrd = Thread(target=self.form_task)
+        self.thrd.start()
+
+    def put(self, image_id, data):
+        self.queue.put((image_id, data))
+
+    def flush(self):
+        # seal the open group without waiting for its deadline
+        self.queue.put(None)
+
+    def form_task(self):
+        while(True):
+            try:
+                first = self.queue.get(block=True, timeout=TIME_OUT)
+            except queue.Empty:
+                if global_var.FLAG_STOP_THREAD:
+                    print("GroupFormer end")
+                    break
+                else:
+                    continue
+            if first is None:
+                continue
+            
+            group = [first]
+            deadline = time.time() + self.wait
+            while len(group) < self.ec_k:
+                try:
+                    item = self.queue.get(block=True, timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    break
+                group.append(item)
+            
+            id_list = [image_id for image_id, _ in group]
+            encode_list = [data for _, data in group]
+            if len(group) < self.ec_k:
+                print("partial group:", id_list)
+            global_var.task_queue_put(groupTask(id_list, encode_list, self.conf))
+
 class Worker:
     def __init__(self, conf, coder, id) -> None:
         self.conf = conf
         self.ec_k = self.conf.cfg['ec_k']
         self.coder = coder
-        self.thrd_pool = ThreadPoolExecutor(max_workers=10)
+        # encode and infer tasks overlap, at most max_inflight at a time
+        self.max_inflight = self.conf.cfg['max_inflight']
+        self.thrd_pool = ThreadPoolExecutor(max_workers=self.max_inflight)
+        self.inflight = BoundedSemaphore(self.max_inflight)
         self.clipperid = id
+        self.batcher = None
+        if self.conf.cfg['encode_batch_size'] > 1:
+            self.batcher = EncodeBatcher(self.conf, self.coder)
+
+    def task_done(self, task):
+        self.inflight.release()
+        if task.exception() is not None:
+            print("task failed:", repr(task.exception()))
 
     def process_task(self):
         while(True):
-            task_list = []
             try:
                 task = global_var.task_queue.get(block=True, timeout=TIME_OUT)
             except queue.Empty:
                 if global_var.FLAG_STOP_THREAD:
+                    self.thrd_pool.shutdown(wait=True)
                     print("Worker end")
                     break
                 else:
                     continue
             
+            if(task.type == TASK_ENCODE_TYPE and self.batcher is not None):
+                self.batcher.put(task.input)
+                continue
+            
+            self.inflight.acquire()
             if(task.type == TASK_ENCODE_TYPE):
-                enc_task = self.thrd_pool.submit(encodeTask, task.input, self.coder)
-                task_list.append(enc_task)
+                running = self.thrd_pool.submit(encodeTask, task.input, self.coder)
             elif(task.type == TASK_INFER_TYPE):
-                inf_task = self.thrd_pool.submit(inferTask, task.input, self.conf, self.clipperid)
-                task_list.append(inf_task)
-            wait(task_list, return_when=ALL_COMPLETED)
+                running = self.thrd_pool.submit(inferTask, task.input, self.conf, self.clipperid)
+            running.add_done_callback(self.task_done)
+
+def reportRepair(image_ids, labels, queued, decodeTime):
+    INFO.add_repairbatch(len(image_ids), decodeTime)
+    for image_id, label, t in zip(image_ids, labels, queued):
+        global_var.resp_queue_put((image_id, label))
+        INFO.add_decodetime(decodeTime)
+        INFO.add_repairtime(float(time.time() - t) * 1000.0)
 
 class Repairer:
-    def __init__(self, ec_k, coder) -> None:
-        self.ec_k = ec_k
+    def __init__(self, conf, coder, decode_queue=None, result_queue=None) -> None:
+        self.conf = conf
+        self.ec_k = conf.cfg['ec_k']
         self.coder = coder
+        # drain up to repair_batch_size repairs within repair_batch_window_ms
+        self.batch_size = conf.cfg['repair_batch_size']
+        self.window = conf.cfg['repair_batch_window_ms'] / 1000.0
+        # in a RepairPool process repairs come from and go back to the parent
+        self.decode_queue = decode_queue
+        self.result_queue = result_queue
 
-    def decode_task(self):
+    def next_batch(self):
+        decode_queue = self.decode_queue
+        if decode_queue is None:
+            decode_queue = global_var.decode_queue
         while(True):
             try:
-                input = global_var.decode_queue.get(block=True, timeout=TIME_OUT)
+                batch = [decode_queue.get(block=True, timeout=TIME_OUT)]
             except queue.Empty:
                 if global_var.FLAG_STOP_THREAD:
-                    print("Repairer end")
-                    break
+                    return None
                 else:
                     continue
-            image_id, out_decode, outbij_decode = input
+            if batch[0] is None:
+                return None
+            
+            deadline = time.time() + self.window
+            while len(batch) < self.batch_size:
+                try:
+                    item = decode_queue.get(block=True, timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    # stop after this batch
+                    decode_queue.put(None)
+                    break
+                batch.append(item)
+            return batch
 
-            print("=========repairTask start=========")
-            # decode
-            start = time.time()
-            resp_tensor = self.coder.decode((out_decode, outbij_decode))
-            end = time.time()
-            print("decode costs: {} ms".format(float(end-start)*1000.0))
-            INFO.add_decodetime(float(end - start) * 1000.0)
-    
-            global_var.resp_queue_put((image_id, resp_tensor.numpy().argmax()))
-            print("=========repairTask end=========")
\ No newline at end of file
+    def repair(self, batch):
+        print("=========repairTask start=========")
+        image_ids, out_decode, outbij_decode, missing, target, queued = zip(*batch)
+        out_decode = torch.stack(out_decode, dim=0)
+        missing = torch.stack(missing, dim=0)
+        target = torch.tensor(target)
+        
+        # decode
+        start = time.time()
+        resp_tensor = self.coder.decode_batch((out_decode, list(outbij_decode), missing, target))
+        end = time.time()
+        print("decode {} repairs costs: {} ms".format(len(batch), float(end-start)*1000.0))
+        
+        labels = [resp.numpy().argmax() for resp in resp_tensor]
+        print("=========repairTask end=========")
+        return image_ids, labels, queued, float(end - start) * 1000.0
+
+    def decode_task(self):
+        while(True):
+            batch = self.next_batch()
+            if batch is None:
+                if self.result_queue is not None:
+                    self.result_queue.put(None)
+                print("Repairer end")
+                break
+            
+            result = self.repair(batch)
+            if self.result_queue is None:
+                reportRepair(*result)
+            else:
+                self.result_queue.put(result)
+
+def repairProcess(conf, decode_queue, result_queue):
+    global_var.queue_init(0)
+    repairer = Repairer(conf, Coder(conf), decode_queue, result_queue)
+    repairer.decode_task()
+
+class RepairPool:
+    # Runs repair_procs Repairers in their own processes. Repairs reach them
+    # through torch.multiprocessing queues, which move the out_bij tensors
+    # through shared memory instead of pickling copies.
+    def __init__(self, conf) -> None:
+        ctx = mp.get_context('spawn')
+        self.decode_queue = ctx.Queue()
+        self.result_queue = ctx.Queue()
+        self.procs = []
+        for _ in range(conf.cfg['repair_procs']):
+            self.procs.append(ctx.Process(target=repairProcess, args=(conf, self.decode_queue, self.result_queue)))
+        for proc in self.procs:
+            proc.start()
+        self.thrd = Thread(target=self.collect_task)
+        self.thrd.start()
+
+    def collect_task(self):
+        running = len(self.procs)
+        while running > 0:
+            result = self.result_queue.get()
+            if result is None:
+                running -= 1
+            else:
+                reportRepair(*result)
+        print("RepairPool end")
+
+    def stop(self):
+        for _ in self.procs:
+            self.decode_queue.put(None)
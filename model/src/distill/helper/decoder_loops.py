@@ -5,6 +5,7 @@ import time
 import torch
 
 from .util import AverageMeter, accuracy
+from models.linear_code import encode as linear_encode
 
 
 def train_vanilla(epoch, train_loader, teacher, model, criterion, optimizer, opt):
@@ -111,17 +112,10 @@ def train_distill(epoch, train_loader, module_list, criterion_list, optimizer, o
         
         # ===============================================
         parity_num = len(input) // opt.ec_k
-        parities = torch.zeros((parity_num, input.shape[1], input.shape[2], input.shape[3]))
-        for i in range(parity_num):
-            parity = torch.zeros_like(input[0])
-            for j in range(opt.ec_k):
-                parity += (1 / opt.ec_k) * input[i*opt.ec_k+j]
-            parities[i] = parity
+        parities = linear_encode(input.reshape((parity_num, opt.ec_k) + tuple(input.shape[1:])))
         
         # ===============================================
         _, tmpinput = teacher(input)
-        if torch.cuda.is_available():
-                parities = parities.cuda()
         _, ptyinput = teacher(parities)
 
         # ===================forward=====================
@@ -283,17 +277,10 @@ def validate(val_loader, model_t, model_s, criterion, opt, teacher=False):
                 target = target.cuda()
             # ========================================
             parity_num = len(data) // opt.ec_k
-            parities = torch.zeros((parity_num, data.shape[1], data.shape[2], data.shape[3]))
-            for i in range(parity_num):
-                parity = torch.zeros_like(data[0])
-                for j in range(opt.ec_k):
-                    parity += (1 / opt.ec_k) * data[i*opt.ec_k + j]
-                parities[i] = parity
+            parities = linear_encode(data.reshape((parity_num, opt.ec_k) + tuple(data.shape[1:])))
             
             # ========================================
             _, tmpinput = model_t(data)
-            if torch.cuda.is_available():
-                parities = parities.cuda()
             _, ptyinput = model_t(parities)
             
             for i in range(opt.ec_k):
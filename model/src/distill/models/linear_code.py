@@ -0,0 +1,33 @@
+import torch
+
+# Linear coding kernels over batches of groups. A batch is [G, k, ...]: G
+# groups of k inputs each. Everything runs on the device of the input, and
+# the results can be written into caller-provided buffers.
+#
+# clipper-asymcc/run/linear_code.py has a copy for serving, keep both in
+# sync.
+
+
+def parity_weights(ec_k, ec_r):
+    # [r, k] weights of the linear parities: parity j is sum_i (i+1)^j * x_i,
+    # normalised so that every row sums to 1 (parity 0 is the plain average).
+    # Any square choice of rows and columns is a nonsingular (generalised)
+    # Vandermonde matrix, so any r missing outputs can be solved for.
+    nodes = torch.arange(1, ec_k + 1, dtype=torch.float64)
+    w = torch.stack([nodes ** j for j in range(ec_r)], dim=0)
+    return (w / w.sum(dim=1, keepdim=True)).float()
+
+
+def encode(input, weights=None, out=None):
+    # [G, k, ...] --> [G, ...] for the average (weights None) or one parity
+    # (weights [k]), [G, r, ...] for r parities (weights [r, k])
+    if weights is None:
+        return torch.mean(input, dim=1, out=out)
+    g, k = input.shape[:2]
+    w = weights.to(input.device, input.dtype)
+    shape = (g,) + tuple(w.shape[:-1]) + tuple(input.shape[2:])
+    if out is None:
+        out = input.new_empty(shape)
+    torch.matmul(w, input.reshape(g, k, -1), out=out.view((g,) + tuple(w.shape[:-1]) + (-1,)))
+    return out
+
@@ -9,6 +9,8 @@ import torch
 
 from models import model_dict
 from models import TeacherModel
+from models.iRevNet import fold_bn
+from models.linear_code import encode as linear_encode
 
 from dataset.cifar100 import get_cifar100_dataloaders, get_cifar100_dataloaders_sample
 from dataset.cifar10 import get_cifar10_dataloaders
@@ -47,6 +49,9 @@ def parse_option():
     parser.add_argument('--et', action='store_true', default=False)
     parser.add_argument('--ee', action='store_true', default=False)
     
+    parser.add_argument('--fold_bn', action='store_true', default=False,
+                        help='fold the teacher batchnorms into its convolutions')
+    
     # EC param K
     parser.add_argument('--ec_k', default=4, type=int, help="EC parameter K")
 
@@ -129,6 +134,8 @@ def main():
     # model
     if opt.irev:
         teacher = load_irevnet_teacher(opt.path_t)
+        if opt.fold_bn:
+            teacher = fold_bn(teacher)
     else:
         teacher = load_teacher(opt.path_t, n_cls)
     
@@ -157,12 +164,7 @@ def main():
                 target = target.cuda()
             # ========================================
             parity_num = len(data) // opt.ec_k
-            parities = torch.zeros((parity_num, data.shape[1], data.shape[2], data.shape[3]))
-            for i in range(parity_num):
-                parity = torch.zeros_like(data[0])
-                for j in range(opt.ec_k):
-                    parity += (1 / opt.ec_k) * data[i*opt.ec_k + j]
-                parities[i] = parity
+            parities = linear_encode(data.reshape((parity_num, opt.ec_k) + tuple(data.shape[1:])))
             
             # ========================================
             start_t = time.time()
@@ -170,8 +172,6 @@ def main():
             end_t = time.time()
             total_time3 += float(end_t - start_t)*1000.0
             
-            if torch.cuda.is_available():
-                parities = parities.cuda()
             _, ptyinput = teacher(parities)
             
             for i in range(opt.ec_k):
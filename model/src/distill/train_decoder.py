@@ -18,6 +18,7 @@ import torch.backends.cudnn as cudnn
 
 from models import model_dict
 from models import TeacherModel
+from models.iRevNet import fold_bn, iRevNet
 from models.util import Embed, ConvReg, LinearEmbed
 from models.util import Connector, Translator, Paraphraser
 
@@ -102,6 +103,10 @@ def parse_option():
     # EC param K
     parser.add_argument('--ec_k', default=4, type=int, help="EC parameter K")
     
+    parser.add_argument('--fold_bn', action='store_true', default=False,
+                        help='fold the teacher batchnorms into its convolutions')
+    parser.add_argument('--low_memory', action='store_true', default=False,
+                        help='recompute the iRevNet student activations in backward instead of storing them')
     parser.add_argument('--et', action="store_true", default=False, help="if evaluate teacher or not")
     parser.add_argument('--es', action="store_true", default=False, help="if evaluate student or not")
 
@@ -237,10 +242,14 @@ def main():
 
     # model
     if opt.irev:
-        teacher = load_irevnet_teacher(opt.path_t) 
+        teacher = load_irevnet_teacher(opt.path_t)
+        if opt.fold_bn:
+            teacher = fold_bn(teacher)
     else:
         teacher = load_teacher(opt.path_t, n_cls)
     model_s = model_dict[opt.model_s](num_classes=n_cls)
+    if opt.low_memory and isinstance(model_s, iRevNet):
+        model_s.low_memory = True
     
     if opt.dataset == 'fashion':
         model_t = TeacherModel(teacher, opt.ec_k, 'fashion')
@@ -65,6 +65,8 @@ parser.add_argument('--resume', default='', type=str, metavar='PATH',
 parser.add_argument('-e', '--evaluate', dest='evaluate', action='store_true',
                     help='evaluate model on validation set')
 parser.add_argument('--dataset', default='cifar10', type=str, help='dataset')
+parser.add_argument('--low_memory', action='store_true',
+                    help='recompute block activations in backward instead of storing them')
 
 
 def main():
@@ -101,7 +103,8 @@ def main():
             model = iRevNet(nBlocks=args.nBlocks, nStrides=args.nStrides,
                             nChannels=args.nChannels, nClasses=nClasses,
                             init_ds=args.init_ds, dropout_rate=0.1, affineBN=True,
-                            in_shape=in_shape, mult=args.bottleneck_mult)
+                            in_shape=in_shape, mult=args.bottleneck_mult,
+                            low_memory=args.low_memory)
             fname = 'i-revnet-'+str(sum(args.nBlocks)+1)
         elif (args.model == 'revnet'):
             raise NotImplementedError
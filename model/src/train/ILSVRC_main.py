@@ -101,6 +101,8 @@ parser.add_argument('--dist-url', default='tcp://224.66.41.62:23456', type=str,
                     help='url used to set up distributed training')
 parser.add_argument('--dist-backend', default='gloo', type=str,
                     help='distributed backend')
+parser.add_argument('--low_memory', action='store_true',
+                    help='recompute block activations in backward instead of storing them')
 
 best_prec1 = 0
 
@@ -120,7 +122,8 @@ def main():
     print("=> creating model '{}'".format(args.arch))
     model = iRevNet(nBlocks=args.nBlocks, nStrides=args.nStrides,
                     nChannels=args.nChannels, nClasses=1000, init_ds=args.init_ds,
-                    dropout_rate=0., affineBN=True, in_shape=[3, 224, 224])
+                    dropout_rate=0., affineBN=True, in_shape=[3, 224, 224],
+                    low_memory=args.low_memory)
 
     if args.invert:
         model = torch.nn.DataParallel(model).cuda()
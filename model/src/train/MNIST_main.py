@@ -75,6 +75,8 @@ parser.add_argument('--data_root', default='/home/mzq/wl/dataset', type=str, hel
 # parser.add_argument('-i', '--invert', dest='invert', action='store_true',
 #                     help='invert samples from validation set')
 parser.add_argument('-c', '--cuda', dest="cuda", action='store_true', help="if use cuda or not")
+parser.add_argument('--low_memory', action='store_true',
+                    help='recompute block activations in backward instead of storing them')
 
 
 def main():
@@ -110,7 +112,8 @@ def main():
             model = iRevNet(nBlocks=args.nBlocks, nStrides=args.nStrides,
                             nChannels=args.nChannels, nClasses=nClasses,
                             init_ds=args.init_ds, dropout_rate=0.1, affineBN=True,
-                            in_shape=in_shape, mult=args.bottleneck_mult)
+                            in_shape=in_shape, mult=args.bottleneck_mult,
+                            low_memory=args.low_memory)
             fname = 'i-revnet-'+str(sum(args.nBlocks)+1)
         elif (args.model == 'revnet'):
             raise NotImplementedError
@@ -79,6 +79,8 @@ parser.add_argument('-c', '--cuda', dest="cuda", action='store_true', help="if u
 parser.add_argument('-j', '--workers', default=2, type=int, metavar='N', help='number of data loading workers (default: 2)')
 parser.add_argument('--distill', action="store_true", help="distill a big model into a smaller model")
 parser.add_argument('--time', action="store_true", help="count the program running time")
+parser.add_argument('--low_memory', action='store_true',
+                    help='recompute block activations in backward instead of storing them')
 
 class iRevNetTeacherModel(nn.Module):
     def __init__(self, model, k):
@@ -132,7 +134,8 @@ def main():
             model = iRevNet(nBlocks=args.nBlocks, nStrides=args.nStrides,
                             nChannels=args.nChannels, nClasses=nClasses,
                             init_ds=args.init_ds, dropout_rate=0.1, affineBN=True,
-                            in_shape=in_shape, mult=args.bottleneck_mult)
+                            in_shape=in_shape, mult=args.bottleneck_mult,
+                            low_memory=args.low_memory)
             fname = 'i-revnet-'+str(sum(args.nBlocks)+1)
         elif (args.model == 'revnet'):
             raise NotImplementedError
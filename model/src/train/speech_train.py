@@ -32,6 +32,8 @@ parser.add_argument('-i', '--invert', dest='invert', action='store_true',
                     help='invert samples from validation set')
 parser.add_argument('-c', '--cuda', dest="cuda", action='store_true', help="if use cuda or not")
 parser.add_argument('-j', '--workers', default=2, type=int, metavar='N', help='number of data loading workers (default: 2)')
+parser.add_argument('--low_memory', action='store_true',
+                    help='recompute block activations in backward instead of storing them')
 
 
 args = parser.parse_args()
@@ -108,7 +110,8 @@ def get_model(args):
         model = iRevNet(nBlocks=args.nBlocks, nStrides=args.nStrides,
                         nChannels=args.nChannels, nClasses=nClasses,
                         init_ds=args.init_ds, dropout_rate=0.1, affineBN=True,
-                        in_shape=in_shape, mult=args.bottleneck_mult)
+                        in_shape=in_shape, mult=args.bottleneck_mult,
+                        low_memory=args.low_memory)
         fname = 'i-revnet-'+str(sum(args.nBlocks)+1)
     elif (args.model == 'revnet'):
         raise NotImplementedError